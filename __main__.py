@@ -0,0 +1,78 @@
+"""Headless tools for .vec3 files, run with python -m voxel_core_model <command> paths..."""
+import argparse
+import sys
+from functools import partial
+from pathlib import Path
+
+from voxel_core_model.batch import EditOptions, RecompressOptions, edit_file, inspect_file, iter_vec3_files, \
+    output_paths, recompress_file, run_batch, validate_file
+from voxel_core_model.model.codec import BlockCodec, CODECS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m voxel_core_model", description=__doc__)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, defaults to CPU count")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print failed files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    inspect_parser = commands.add_parser("inspect", help="print a summary of every file")
+    validate_parser = commands.add_parser("validate", help="check block sizes, flags, materials and indices, "
+                                                       "then decode every file")
+    recompress_parser = commands.add_parser("recompress", help="rewrite files with other compression settings")
+    recompress_parser.add_argument("--codec", choices=[BlockCodec(codec_id).name.lower() for codec_id in CODECS],
+                                   default=BlockCodec.GZIP.name.lower())
+    recompress_parser.add_argument("--level", type=int, default=9, help="compression level")
+    recompress_parser.add_argument("--uncompressed", action="store_true", help="store blocks uncompressed")
+    recompress_parser.add_argument("--filter", action="store_true", help="delta and byte-shuffle filter blocks")
+    edit_parser = commands.add_parser("edit", help="rename or drop models and rename materials without decoding")
+    edit_parser.add_argument("--rename", metavar="OLD=NEW", action="append", default=[], help="rename a model")
+    edit_parser.add_argument("--drop", metavar="NAME", action="append", default=[], help="remove a model")
+    edit_parser.add_argument("--material", metavar="OLD=NEW", action="append", default=[],
+                             help="rename a material, materials renamed to an existing name are merged")
+    for command_parser in (recompress_parser, edit_parser):
+        command_parser.add_argument("-o", "--output", type=Path, default=None,
+                                    help="output directory, files are rewritten in place when not set")
+    for command_parser in (inspect_parser, validate_parser, recompress_parser, edit_parser):
+        command_parser.add_argument("paths", type=Path, nargs="+", help=".vec3 files or directories to search")
+    args = parser.parse_args(argv)
+
+    files = list(iter_vec3_files(args.paths))
+    outputs = None
+    if args.command == "inspect":
+        func = inspect_file
+    elif args.command == "validate":
+        func = validate_file
+    else:
+        try:
+            outputs = output_paths(files, args.output)
+            if args.command == "edit":
+                options = EditOptions(_parse_pairs(args.rename), frozenset(args.drop), _parse_pairs(args.material))
+                func = partial(edit_file, options=options)
+            else:
+                func = partial(recompress_file, options=RecompressOptions(
+                    not args.uncompressed, BlockCodec[args.codec.upper()], args.level, args.filter))
+        except ValueError as e:
+            parser.error(str(e))
+
+    failed = 0
+    for result in run_batch(func, [path for path, _ in files], args.jobs, outputs):
+        if not result.ok:
+            failed += 1
+        if not result.ok or not args.quiet:
+            print(f"{result.path}: {'' if result.ok else 'FAILED '}{result.message}",
+                  file=sys.stdout if result.ok else sys.stderr)
+    return 1 if failed else 0
+
+
+def _parse_pairs(pairs: list[str]) -> dict[str, str]:
+    result = {}
+    for pair in pairs:
+        old, separator, new = pair.partition("=")
+        if not separator:
+            raise ValueError(f"expected OLD=NEW, got {pair!r}")
+        result[old] = new
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""bpy independent batch operations over .vec3 files, used by the command line interface in __main__"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from voxel_core_model.file_utils import BufferedFileBuffer, MemoryBuffer, replace_on_success
+from voxel_core_model.model.body import Body, load_model_from_buffer, load_model_from_path, write_model_to_buffer
+from voxel_core_model.model.edit import drop_models, rename_materials, rename_models
+from voxel_core_model.model.codec import BlockCodec
+from voxel_core_model.model.mesh import Mesh, MeshFlags, MESH_CODEC_SHIFT
+from voxel_core_model.model.validate import ValidationError
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, ATTRIBUTE_CODEC_SHIFT, \
+    ATTRIBUTE_ENCODING_MASK
+
+# Files are loaded with validation, so malformed content surfaces as ValidationError and the rest as OSError
+_FILE_ERRORS = (ValidationError, OSError)
+# Names are written as ascii with a uint16 length
+_MAX_NAME_LENGTH = 0xFFFF
+
+
+@dataclass(slots=True, frozen=True)
+class FileResult:
+    path: Path
+    ok: bool
+    message: str
+
+
+@dataclass(slots=True, frozen=True)
+class RecompressOptions:
+    compress: bool = True
+    codec: BlockCodec = BlockCodec.GZIP
+    compression_level: int = 9
+    filter_blocks: bool = False
+
+
+@dataclass(slots=True, frozen=True)
+class EditOptions:
+    rename: dict[str, str] = field(default_factory=dict)  # model names
+    drop: frozenset[str] = frozenset()  # names of models to remove
+    materials: dict[str, str] = field(default_factory=dict)  # material names
+
+    def __post_init__(self):
+        for name in (*self.rename.values(), *self.materials.values()):
+            if not name.isascii() or len(name) > _MAX_NAME_LENGTH:
+                raise ValueError(f"New name {name[:64]!r} is not ascii or longer than {_MAX_NAME_LENGTH} characters")
+
+
+def iter_vec3_files(paths: Iterable[Path]) -> Iterator[tuple[Path, Path]]:
+    """Yields given files and all .vec3 files found below given directories, each with its path relative
+    to the argument it was found under"""
+    for path in paths:
+        if path.is_dir():
+            for file in sorted(path.rglob("*.vec3")):
+                yield file, file.relative_to(path)
+        else:
+            yield path, Path(path.name)
+
+
+def output_paths(files: Iterable[tuple[Path, Path]], output: Optional[Path]) -> list[Path]:
+    """Output path of every (path, relative path) pair, files are rewritten in place when output is not set.
+    Raises ValueError when two files would be written to the same path."""
+    outputs = []
+    seen: dict[str, Path] = {}
+    for path, relative in files:
+        target = path if output is None else output / relative
+        key = os.path.normcase(target.resolve())
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {path} would both be written to {target}")
+        seen[key] = path
+        outputs.append(target)
+    return outputs
+
+
+def inspect_file(path: Path) -> FileResult:
+    try:
+        body = load_model_from_path(path, lazy=True, validate=True, check_indices=False)
+        instance_count = sum(model.is_instance for model in body.models)
+        meshes = [mesh for model in body.models if not model.is_instance for mesh in model.meshes]
+        attributes = [attribute for mesh in meshes for attribute in mesh.attributes]
+        codecs = sorted({item.codec.name.lower() for item in (*meshes, *attributes)
+                         if item.flags & VertexAttributeFlags.GZIP})
+        encodings = sorted({attribute.encoding.name.lower() for attribute in attributes})
+        triangles = sum(mesh.triangle_count for mesh in meshes)
+        message = (f"{len(body.models)} models ({instance_count} instances), {len(body.materials)} materials, "
+                   f"{len(meshes)} meshes, {triangles} triangles, {path.stat().st_size} bytes, "
+                   f"codecs: {', '.join(codecs) or 'none'}, encodings: {', '.join(encodings) or 'none'}")
+        return FileResult(path, True, message)
+    except _FILE_ERRORS as e:
+        return FileResult(path, False, str(e))
+
+
+def validate_file(path: Path) -> FileResult:
+    """Runs structural validation, then decodes all payloads to catch corrupted compressed data"""
+    try:
+        load_model_from_path(path, validate=True)
+        problems = []
+    except ValidationError as e:
+        problems = e.problems
+    except OSError as e:
+        problems = [str(e)]
+    return FileResult(path, not problems, "; ".join(problems) or "ok")
+
+
+def recompress_file(path: Path, options: RecompressOptions, output: Optional[Path] = None) -> FileResult:
+    """Rewrites blocks with new compression settings to output, or in place when it is not set.
+    Attribute encodings and index width are kept."""
+    attribute_flags = VertexAttributeFlags.NONE
+    mesh_flags = MeshFlags.NONE
+    if options.compress:
+        attribute_flags |= VertexAttributeFlags.GZIP | (options.codec << ATTRIBUTE_CODEC_SHIFT)
+        mesh_flags |= MeshFlags.GZIP | (options.codec << MESH_CODEC_SHIFT)
+    if options.filter_blocks:
+        attribute_flags |= VertexAttributeFlags.FILTERED
+        mesh_flags |= MeshFlags.FILTERED
+
+    def recompress_attribute(attribute: VertexAttribute):
+        encoding = attribute.flags & ATTRIBUTE_ENCODING_MASK
+        return replace(attribute, flags=VertexAttributeFlags(encoding | attribute_flags))
+
+    def recompress_mesh(mesh: Mesh):
+        return replace(mesh, flags=MeshFlags(mesh.flags & MeshFlags.USHORT_INDICES | mesh_flags),
+                       attributes=[recompress_attribute(attribute) for attribute in mesh.attributes])
+
+    try:
+        old_size = path.stat().st_size
+        # Everything is decoded up front, so corrupted payloads fail validation before anything is written
+        body = _load_for_rewrite(path, output, validate=True)
+        body = replace(body, models=[replace(model, meshes=[recompress_mesh(mesh) for mesh in model.meshes])
+                                     for model in body.models])
+        output = _write_output(path, body, output, options.compression_level)
+        return FileResult(path, True, f"{old_size} -> {output.stat().st_size} bytes")
+    except _FILE_ERRORS as e:
+        return FileResult(path, False, str(e))
+
+
+def edit_file(path: Path, options: EditOptions, output: Optional[Path] = None) -> FileResult:
+    """Renames or drops models and renames materials, payloads are copied verbatim without decoding.
+    The result is written to output, or in place when it is not set."""
+    try:
+        # Indices are passed through, so only the structure is checked and nothing gets decompressed
+        body = _load_for_rewrite(path, output, lazy=True, validate=True, check_indices=False)
+        model_count = len(body.models)
+        if options.materials:
+            body = rename_materials(body, options.materials)
+        if options.drop:
+            body = drop_models(body, options.drop)
+        if options.rename:
+            body = rename_models(body, options.rename)
+        output = _write_output(path, body, output)
+        return FileResult(path, True, f"{model_count} -> {len(body.models)} models, {len(body.materials)} materials, "
+                                      f"{output.stat().st_size} bytes")
+    except _FILE_ERRORS as e:
+        return FileResult(path, False, str(e))
+
+
+def _load_for_rewrite(path: Path, output: Optional[Path], **kwargs) -> Body:
+    """Files rewritten in place are read into memory instead of being mapped. Loaded blocks keep views into
+    their buffer until written, and a mapped file can not be replaced on Windows."""
+    if output is None or os.path.normcase(output.resolve()) == os.path.normcase(path.resolve()):
+        return load_model_from_buffer(MemoryBuffer(path.read_bytes()), **kwargs)
+    return load_model_from_path(path, **kwargs)
+
+
+def _write_output(path: Path, body: Body, output: Optional[Path], compression_level: int = 9) -> Path:
+    """Writes body next to a temporary name first, so a failed write never leaves a truncated file behind"""
+    if output is None:
+        output = path
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with replace_on_success(output) as temp_output, BufferedFileBuffer(temp_output, "wb") as f:
+        write_model_to_buffer(f, body, compression_level)
+    return output
+
+
+def run_batch(func: Callable[..., FileResult], paths: Iterable[Path], workers: Optional[int] = None,
+              outputs: Optional[Iterable[Path]] = None) -> Iterator[FileResult]:
+    """Runs func over files on a process pool, results are yielded in input order.
+    With outputs func is called with the matching output path as output."""
+    args = [list(paths)]
+    if outputs is not None:
+        func = partial(_call_with_output, func)
+        args.append(list(outputs))
+    if workers == 1 or len(args[0]) < 2:
+        yield from map(func, *args)
+        return
+    chunk_size = max(1, len(args[0]) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(func, *args, chunksize=chunk_size)
+
+
+def _call_with_output(func: Callable[..., FileResult], path: Path, output: Path) -> FileResult:
+    return func(path, output=output)
@@ -0,0 +1,49 @@
+"""Benchmark for geometry.extract, run with python -m voxel_core_model.benchmarks.extract"""
+import argparse
+import time
+
+import numpy as np
+
+from voxel_core_model.geometry.extract import extract_intermediate_mesh
+
+
+def make_grid_arrays(size: int):
+    """Flat arrays of a size x size quad grid, laid out the way Blender foreach_get returns them"""
+    xs, ys = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    vertex_positions = np.stack((xs.ravel(), ys.ravel(), np.zeros(xs.size, np.float32)), axis=1).ravel()
+
+    quad = np.arange(size * size)
+    row, column = np.divmod(quad, size)
+    corner = row * (size + 1) + column
+    loop_vertex_indices = np.stack((corner, corner + 1, corner + size + 2, corner + size + 1), axis=1).ravel()
+    loop_normals = np.tile(np.array([0, 0, 1], np.float32), loop_vertex_indices.size)
+    loop_uvs = vertex_positions.reshape(-1, 3)[loop_vertex_indices, :2].ravel() / size
+
+    quad_loops = np.arange(size * size * 4).reshape(-1, 4)
+    triangle_loops = np.concatenate((quad_loops[:, [0, 1, 2]], quad_loops[:, [0, 2, 3]]), axis=1).ravel()
+    triangle_material_ids = np.zeros(size * size * 2, np.int32)
+    return (vertex_positions, loop_vertex_indices, loop_normals, loop_uvs, triangle_loops,
+            triangle_material_ids, ["NoMaterial"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("sizes", type=int, nargs="*", default=[64, 256, 1024])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        arrays = make_grid_arrays(size)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            extract_intermediate_mesh(*arrays)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        triangles = size * size * 2
+        print(f"{size:>5}x{size:<5} grid {triangles:>10} triangles: {best * 1000:9.2f} ms "
+              f"({triangles / best / 1e6:.2f} Mtri/s)")
+
+
+if __name__ == "__main__":
+    main()
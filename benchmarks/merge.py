@@ -0,0 +1,51 @@
+"""Benchmark for geometry.merge, run with python -m voxel_core_model.benchmarks.merge"""
+import argparse
+import time
+
+import numpy as np
+
+from voxel_core_model.geometry.merge import merge_meshes
+from voxel_core_model.model.mesh import Mesh, MeshFlags
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType
+
+
+def make_meshes(mesh_count: int, triangle_count: int, seed: int = 0) -> list[Mesh]:
+    rng = np.random.default_rng(seed)
+    meshes = []
+    for material_id in range(mesh_count):
+        pool_size = min(triangle_count * 3, 255)
+        attributes = [
+            VertexAttribute(VertexAttributeType.POSITION, VertexAttributeFlags.NONE,
+                            rng.random((pool_size, 3), np.float32)),
+            VertexAttribute(VertexAttributeType.UV, VertexAttributeFlags.NONE,
+                            rng.random((pool_size, 2), np.float32)),
+            VertexAttribute(VertexAttributeType.NORMAL, VertexAttributeFlags.NONE,
+                            rng.random((pool_size, 3), np.float32)),
+        ]
+        indices = rng.integers(0, pool_size, (triangle_count, 3, len(attributes)), np.uint8)
+        meshes.append(Mesh(material_id, MeshFlags.NONE, attributes, indices))
+    return meshes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--triangles", type=int, default=1000, help="triangles per mesh")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("mesh_counts", type=int, nargs="*", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    for mesh_count in args.mesh_counts:
+        meshes = make_meshes(mesh_count, args.triangles)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            merge_meshes(meshes)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        triangles = mesh_count * args.triangles
+        print(f"{mesh_count:>6} meshes {triangles:>10} triangles: {best * 1000:9.2f} ms "
+              f"({triangles / best / 1e6:.1f} Mtri/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Load, write and convert benchmarks on synthetic bodies, run with python -m voxel_core_model.benchmarks.suite
+
+Results can be stored as a JSON baseline (--output) and later runs compared against it (--compare),
+the exit code is 1 when any timing regressed by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from voxel_core_model.benchmarks.extract import make_grid_arrays
+from voxel_core_model.file_utils import MemoryBuffer, WritableMemoryBuffer
+from voxel_core_model.geometry.convert import ExportOptions, convert_to_vec3_meshes
+from voxel_core_model.geometry.extract import IntermediateMesh, extract_intermediate_mesh
+from voxel_core_model.model.body import Body, load_model_from_buffer, write_model_to_buffer
+from voxel_core_model.model.material import Material, MaterialFlags, MaterialTable
+from voxel_core_model.model.model import Model
+
+TIMINGS = ("convert", "write", "load")
+
+
+@dataclass(slots=True, frozen=True)
+class Case:
+    name: str
+    meshes: list[IntermediateMesh]
+    materials: MaterialTable
+    options: ExportOptions
+
+    @property
+    def triangles(self) -> int:
+        return sum(mesh.polygons.shape[0] for mesh in self.meshes)
+
+
+def make_sphere_arrays(size: int):
+    """Flat arrays of a UV sphere with size segments and size rings, same layout as make_grid_arrays"""
+    arrays = list(make_grid_arrays(size))
+    grid = arrays[0].reshape(-1, 3)
+    theta = grid[:, 0] / size * 2 * np.pi
+    phi = grid[:, 1] / size * np.pi
+    sphere = np.stack((np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)), axis=1)
+    arrays[0] = sphere.astype(np.float32).ravel()
+    arrays[2] = sphere[arrays[1]].astype(np.float32).ravel()
+    return tuple(arrays)
+
+
+def _material_table(names: list[str]) -> MaterialTable:
+    materials = MaterialTable()
+    for name in names:
+        materials.add(Material(name, MaterialFlags.NONE))
+    return materials
+
+
+def make_cases(scale: int, compress: bool) -> list[Case]:
+    options = ExportOptions(compress=compress)
+    suffix = "gzip" if compress else "raw"
+    grid = extract_intermediate_mesh(*make_grid_arrays(scale))
+    sphere = extract_intermediate_mesh(*make_sphere_arrays(scale))
+
+    material_arrays = list(make_grid_arrays(scale))
+    material_count = 64
+    material_arrays[5] = np.arange(material_arrays[5].size, dtype=np.int32) % material_count
+    material_arrays[6] = [f"material_{i}" for i in range(material_count)]
+    many_materials = extract_intermediate_mesh(*material_arrays)
+
+    submodel = extract_intermediate_mesh(*make_grid_arrays(max(scale // 16, 1)))
+    return [
+        Case(f"grid_{scale}_{suffix}", [grid], _material_table(grid.materials), options),
+        Case(f"sphere_{scale}_{suffix}", [sphere], _material_table(sphere.materials), options),
+        Case(f"materials_{scale}_{suffix}", [many_materials], _material_table(many_materials.materials), options),
+        Case(f"submodels_{scale}_{suffix}", [submodel] * 256, _material_table(submodel.materials), options),
+    ]
+
+
+def _convert(case: Case) -> Body:
+    models = []
+    for i, mesh in enumerate(case.meshes):
+        meshes = convert_to_vec3_meshes(mesh, case.materials, case.options.compress, case.options.tolerance,
+                                        case.options.filter_blocks, case.options.codec)
+        models.append(Model(f"model_{i}", (0.0, 0.0, 0.0), meshes))
+    return Body(models, case.materials.materials)
+
+
+def _write(body: Body, options: ExportOptions) -> bytes:
+    buffer = WritableMemoryBuffer()
+    write_model_to_buffer(buffer, body, options.compression_level, options.workers)
+    return buffer.getvalue()
+
+
+def _best_time(func: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _peak_memory(func: Callable) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Case, repeat: int) -> dict:
+    body = _convert(case)
+    data = _write(body, case.options)
+    funcs = {
+        "convert": lambda: _convert(case),
+        "write": lambda: _write(body, case.options),
+        "load": lambda: load_model_from_buffer(MemoryBuffer(data)),
+    }
+    result = {"triangles": case.triangles, "bytes": len(data)}
+    for name, func in funcs.items():
+        seconds = _best_time(func, repeat)
+        result[f"{name}_s"] = seconds
+        result[f"{name}_mtri_s"] = case.triangles / seconds / 1e6
+        result[f"{name}_peak_bytes"] = _peak_memory(func)
+    result["write_mb_s"] = len(data) / result["write_s"] / 1e6
+    result["load_mb_s"] = len(data) / result["load_s"] / 1e6
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns descriptions of timings slower than baseline by more than threshold (0.1 is 10%)"""
+    regressions = []
+    for case_name, result in results.items():
+        base = baseline.get(case_name)
+        if base is None:
+            continue
+        for name in TIMINGS:
+            ratio = result[f"{name}_s"] / base[f"{name}_s"]
+            if ratio > 1 + threshold:
+                regressions.append(f"{case_name} {name}: {base[f'{name}_s'] * 1000:.2f} ms -> "
+                                   f"{result[f'{name}_s'] * 1000:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scales", type=int, nargs="+", default=[32, 128, 512], help="grid and sphere segments")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for scale in args.scales:
+        for compress in (False, True):
+            for case in make_cases(scale, compress):
+                if args.filter not in case.name:
+                    continue
+                result = results[case.name] = run_case(case, args.repeat)
+                print(f"{case.name:<24} {result['triangles']:>9} tris {result['bytes']:>11} bytes | " +
+                      " | ".join(f"{name} {result[f'{name}_s'] * 1000:9.2f} ms "
+                                 f"{result[f'{name}_peak_bytes'] / 1e6:8.1f} MB" for name in TIMINGS))
+
+    if args.output:
+        report = {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cache of converted and encoded meshes for repeated exports, bpy independent"""
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import numpy as np
+
+from voxel_core_model.model.body import encode_meshes
+from voxel_core_model.model.mesh import Mesh
+
+
+def cache_key(arrays: Iterable[np.ndarray], *extra) -> bytes:
+    """Content hash of mesh arrays and anything else the conversion depends on (material ids, export options)"""
+    digest = hashlib.blake2b(digest_size=20)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(memoryview(array).cast("B"))
+    digest.update(repr(extra).encode())
+    return digest.digest()
+
+
+class ExportCache:
+    """Keeps meshes of recently exported objects as encoded blocks only, least recently used entries are evicted
+    once total payload size exceeds max_bytes"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[list[Mesh], int]] = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[list[Mesh]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: bytes, meshes: list[Mesh], compression_level: int = 9,
+            workers: Optional[int] = 1) -> list[Mesh]:
+        """Encodes meshes and stores them, returns block only meshes which are written without encoding again"""
+        if workers == 1:
+            encoded = encode_meshes(meshes, compression_level)
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                encoded = encode_meshes(meshes, compression_level, pool)
+        entry_size = sum(item.block.size for mesh in encoded for item in (mesh, *mesh.attributes))
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        if entry_size <= self.max_bytes:
+            self._entries[key] = encoded, entry_size
+            self.size += entry_size
+            self.evict()
+        return encoded
+
+    def evict(self):
+        while self.size > self.max_bytes and self._entries:
+            _, (_, entry_size) = self._entries.popitem(last=False)
+            self.size -= entry_size
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (f"<ExportCache entries={len(self)} size={self.size}/{self.max_bytes} "
+                f"hits={self.hits} misses={self.misses}>")
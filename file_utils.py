@@ -4,16 +4,23 @@
 import abc
 import binascii
 import contextlib
+import functools
 import io
+import mmap
 import os
 import struct
 from pathlib import Path
-from struct import calcsize, pack, unpack
-from typing import Optional, Protocol, Union, TypeVar, Type
+from typing import Iterator, Optional, Protocol, Union, TypeVar, Type
 
 T = TypeVar("T")
 
 
+@functools.lru_cache(maxsize=256)
+def compiled_struct(fmt: str) -> struct.Struct:
+    """Precompiled struct for a format string including byte order, so size and packing code are computed once"""
+    return struct.Struct(fmt)
+
+
 class Buffer(abc.ABC, io.RawIOBase):
     def __init__(self):
         io.RawIOBase.__init__(self)
@@ -70,10 +77,22 @@ class Buffer(abc.ABC, io.RawIOBase):
         self.seek(size, io.SEEK_CUR)
 
     def read_fmt(self, fmt):
-        return unpack(self._endian + fmt, self.read(calcsize(self._endian + fmt)))
+        compiled = compiled_struct(self._endian + fmt)
+        return compiled.unpack(self.read(compiled.size))
+
+    def read_struct(self, compiled: struct.Struct) -> tuple:
+        return compiled.unpack(self.read(compiled.size))
+
+    def read_view(self, size: int):
+        """Read size bytes as a bytes-like object. Memory backed buffers return a view without copying."""
+        data = self.read(size)
+        if len(data) != size:
+            raise BufferError(f"Not enough data left({len(data)}) in buffer to read {size} bytes")
+        return data
 
     def _read(self, fmt):
-        return unpack(self._endian + fmt, self.read(calcsize(self._endian + fmt)))[0]
+        compiled = compiled_struct(self._endian + fmt)
+        return compiled.unpack(self.read(compiled.size))[0]
 
     def read_relative_offset32(self):
         return self.tell() + self.read_uint32()
@@ -110,7 +129,8 @@ class Buffer(abc.ABC, io.RawIOBase):
 
     def read_ascii_string(self, length: Optional[int] = None):
         if length is not None:
-            buffer = self.read(length).strip(b'\x00').rstrip(b'\x00')
+            # Short reads raise, so a name cut off by the end of the data is not returned truncated
+            buffer = bytes(self.read_view(length)).strip(b'\x00').rstrip(b'\x00')
             if b'\x00' in buffer:
                 buffer = buffer[:buffer.index(b'\x00')]
             return buffer.decode('latin', errors='replace')
@@ -135,7 +155,10 @@ class Buffer(abc.ABC, io.RawIOBase):
         return self.read_ascii_string(4)
 
     def write_fmt(self, fmt: str, *values):
-        self.write(pack(self._endian + fmt, *values))
+        self.write(compiled_struct(self._endian + fmt).pack(*values))
+
+    def write_struct(self, compiled: struct.Struct, *values):
+        self.write(compiled.pack(*values))
 
     def write_uint64(self, value):
         self.write_fmt('Q', value)
@@ -169,8 +192,7 @@ class Buffer(abc.ABC, io.RawIOBase):
 
     def write_ascii_string(self, string, zero_terminated=False, length=-1):
         pos = self.tell()
-        for c in string:
-            self.write(c.encode('ascii'))
+        self.write(string.encode('ascii'))
         if zero_terminated:
             self.write(b'\x00')
         elif length != -1:
@@ -231,13 +253,14 @@ class MemoryBuffer(Buffer):
         return len(self._buffer)
 
     def _read(self, fmt: str):
-        data = struct.unpack_from(self._endian + fmt, self._buffer, self._offset)
-        self._offset += struct.calcsize(self._endian + fmt)
-        return data[0]
+        return self.read_struct(compiled_struct(self._endian + fmt))[0]
 
     def read_fmt(self, fmt):
-        data = struct.unpack_from(self._endian + fmt, self._buffer, self._offset)
-        self._offset += struct.calcsize(self._endian + fmt)
+        return self.read_struct(compiled_struct(self._endian + fmt))
+
+    def read_struct(self, compiled: struct.Struct) -> tuple:
+        data = compiled.unpack_from(self._buffer, self._offset)
+        self._offset += compiled.size
         return data
 
     def write(self, _b: Union[bytes, bytearray]) -> Optional[int]:
@@ -256,6 +279,13 @@ class MemoryBuffer(Buffer):
         self._offset += _size
         return data.tobytes()
 
+    def read_view(self, size: int) -> memoryview:
+        if self._offset + size > self.size():
+            raise BufferError(f"Not enough data left({self.remaining()}) in buffer to read {size} bytes")
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += size
+        return data
+
     def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
         if whence == io.SEEK_SET:
             self._offset = offset
@@ -358,6 +388,107 @@ class FileBuffer(io.FileIO, Buffer):
             return MemorySlice(self.read(size), slice_offset)
 
 
+class BufferedFileBuffer(Buffer):
+    """File buffer that reads ahead and collects writes in block_size chunks, so small header fields
+    do not cost a syscall each. Size is tracked without seeking."""
+
+    def __init__(self, file: Union[str, Path, int], mode: str = 'r', block_size: int = 1 << 16):
+        super().__init__()
+        raw = io.FileIO(file, mode)
+        if raw.readable() and raw.writable():
+            self._file = io.BufferedRandom(raw, block_size)
+        elif raw.writable():
+            self._file = io.BufferedWriter(raw, block_size)
+        else:
+            self._file = io.BufferedReader(raw, block_size)
+        self.name = raw.name
+        self.block_size = block_size
+        self._cached_size = None if raw.writable() else os.fstat(raw.fileno()).st_size
+        # Bound methods of the C buffered object, so reading a field costs no extra Python call
+        self.read = self._file.read
+        self.write = self._file.write
+        self.seek = self._file.seek
+        self.tell = self._file.tell
+
+    def readable(self) -> bool:
+        return self._file.readable()
+
+    def writable(self) -> bool:
+        return self._file.writable()
+
+    def seekable(self) -> bool:
+        return self._file.seekable()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def flush(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+
+    def size(self):
+        if self._cached_size is not None:
+            return self._cached_size
+        if self._file.closed:
+            return -1
+        # Seeking flushes pending writes, so unflushed data never ends before the current offset
+        return max(os.fstat(self._file.fileno()).st_size, self._file.tell())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        super().close()
+
+    @property
+    def data(self):
+        with self.save_current_offset():
+            self.seek(0)
+            return self.read()
+
+    def __repr__(self) -> str:
+        if self._file.closed:
+            return f'<BufferedFileBuffer: {self.name!r} closed>'
+        return f'<BufferedFileBuffer: {self.name!r} {self.tell()}/{self.size()}>'
+
+    def slice(self, offset: Optional[int] = None, size: int = -1) -> 'MemorySlice':
+        with self.save_current_offset():
+            if offset is not None:
+                self.seek(offset)
+            slice_offset = self.tell()
+            return MemorySlice(self.read(size), slice_offset)
+
+
+class MappedFileBuffer(MemoryBuffer):
+    """Read-only buffer over a memory-mapped file.
+
+    Views returned by read_view and slice point straight into the mapping, the mapping itself
+    stays alive until the last of them is released, even after the buffer is closed.
+    """
+
+    def __init__(self, file: Union[str, Path]):
+        with open(file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                mapping = b''
+        super().__init__(mapping)
+        self._mmap = mapping
+        self.name = str(file)
+
+    def close(self) -> None:
+        super().close()
+        mapping, self._mmap = self._mmap, None
+        if isinstance(mapping, mmap.mmap):
+            # Arrays created over the mapping are still exporting it, let GC unmap it later
+            with contextlib.suppress(BufferError):
+                mapping.close()
+
+    def __repr__(self) -> str:
+        if self.closed:
+            return f'<MappedFileBuffer: {self.name!r} closed>'
+        return f'<MappedFileBuffer: {self.name!r} {self.tell()}/{self.size()}>'
+
+
 class MemorySlice(MemoryBuffer):
     def __init__(self, buffer: Union[bytes, bytearray, memoryview], offset: int):
         super().__init__(buffer)
@@ -367,6 +498,20 @@ class MemorySlice(MemoryBuffer):
         return self.tell() + self._slice_offset
 
 
+@contextlib.contextmanager
+def replace_on_success(path: Union[str, Path]) -> Iterator[Path]:
+    """Yields a temporary path next to path, which replaces path once the block finishes without an exception.
+    On failure the temporary file is removed and path is left as it was."""
+    path = Path(path)
+    temp_path = path.with_name(path.name + ".tmp")
+    try:
+        yield temp_path
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    os.replace(temp_path, path)
+
+
 class Readable(Protocol):
     @classmethod
     def from_buffer(cls: Type[T], buffer: Buffer) -> T:
@@ -375,4 +520,5 @@ class Readable(Protocol):
 
 TR = TypeVar("TR", bound=Readable)
 
-__all__ = ['Buffer', 'MemoryBuffer', 'WritableMemoryBuffer', 'FileBuffer', 'Readable']
+__all__ = ['Buffer', 'MemoryBuffer', 'WritableMemoryBuffer', 'FileBuffer', 'BufferedFileBuffer', 'MappedFileBuffer',
+           'Readable', 'replace_on_success']
@@ -0,0 +1,185 @@
+"""Conversion of welded mesh data to VEC3 meshes, bpy independent so it can run outside of Blender"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from voxel_core_model.geometry.extract import IntermediateMesh, extract_intermediate_mesh
+from voxel_core_model.geometry.vertex_cache import VertexCacheStats, optimize_mesh_vertex_cache
+from voxel_core_model.geometry.vertex_fetch import VertexFetchStats, measure_vertex_fetch, optimize_vertex_fetch
+from voxel_core_model.geometry.weld import WeldTolerance, weld
+from voxel_core_model.model.codec import BlockCodec
+from voxel_core_model.model.material import MaterialTable
+from voxel_core_model.model.mesh import Mesh, MeshFlags, MESH_CODEC_SHIFT
+from voxel_core_model.model.quantize import AttributeEncoding
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeType, VertexAttributeFlags, \
+    ATTRIBUTE_CODEC_SHIFT, ATTRIBUTE_ENCODING_SHIFT
+from voxel_core_model.profiling import add_stats, phase
+
+DIRECTION_SWAP = np.asarray([1, -1, 1], np.float32)
+AXIS_SWAP = [0, 2, 1]
+MAX_UBYTE_POOL_SIZE = 0x100
+MAX_USHORT_POOL_SIZE = 0x10000
+
+
+@dataclass(slots=True, frozen=True)
+class ExportOptions:
+    compress: bool = False
+    compression_level: int = 9
+    codec: BlockCodec = BlockCodec.GZIP
+    filter_blocks: bool = False
+    optimize_vertex_cache: bool = False
+    optimize_vertex_fetch: bool = False
+    tolerance: WeldTolerance = WeldTolerance()
+    workers: int = 1
+    position_encoding: AttributeEncoding = AttributeEncoding.FLOAT32
+    normal_encoding: AttributeEncoding = AttributeEncoding.FLOAT32
+    uv_encoding: AttributeEncoding = AttributeEncoding.FLOAT32
+    instance_linked: bool = False
+
+
+def convert_to_vec3_meshes(mesh_data: IntermediateMesh, materials: MaterialTable, compress=False,
+                           tolerance: Optional[WeldTolerance] = None, filter_blocks=False,
+                           codec: BlockCodec = BlockCodec.GZIP,
+                           encodings: Optional[dict[VertexAttributeType, AttributeEncoding]] = None) -> list[Mesh]:
+    """encodings maps attribute types to quantized encodings, positions are normalized to bounds of the whole model
+    so split meshes share one grid"""
+    meshes: list[Mesh] = []
+    if tolerance is None:
+        tolerance = WeldTolerance()
+
+    attribute_flags = VertexAttributeFlags.NONE
+    mesh_flags = MeshFlags.NONE
+    if compress:
+        attribute_flags |= VertexAttributeFlags.GZIP | (codec << ATTRIBUTE_CODEC_SHIFT)
+        mesh_flags |= MeshFlags.GZIP | (codec << MESH_CODEC_SHIFT)
+    if filter_blocks:
+        attribute_flags |= VertexAttributeFlags.FILTERED
+        mesh_flags |= MeshFlags.FILTERED
+
+    positions = (np.asarray(mesh_data.positions, np.float32) * DIRECTION_SWAP)[:, AXIS_SWAP]
+    normals = (np.asarray(mesh_data.normals, np.float32) * DIRECTION_SWAP)[:, AXIS_SWAP]
+    uvs = np.asarray(mesh_data.uvs, np.float32)
+    polygons = np.asarray(mesh_data.polygons, np.uint32)
+    material_ids = np.asarray(mesh_data.material_ids, np.uint32)
+
+    encodings = dict(encodings or {})
+    if encodings.get(VertexAttributeType.UV) == AttributeEncoding.UNORM16 and uvs.size and \
+            (uvs.min() < 0 or uvs.max() > 1):
+        # Tiled UVs would be clamped by unorm16
+        encodings[VertexAttributeType.UV] = AttributeEncoding.HALF
+    types_flags = {
+        v_type: attribute_flags | (encodings.get(v_type, AttributeEncoding.FLOAT32) << ATTRIBUTE_ENCODING_SHIFT)
+        for v_type in (VertexAttributeType.POSITION, VertexAttributeType.UV, VertexAttributeType.NORMAL)
+    }
+    position_bounds = None
+    if positions.size:
+        position_bounds = np.stack((positions.min(axis=0), positions.max(axis=0)))
+
+    # Group triangles by material with one stable sort instead of a mask per material
+    triangle_order = np.argsort(material_ids, kind="stable")
+    sorted_material_ids = material_ids[triangle_order]
+    group_starts = np.flatnonzero(np.diff(sorted_material_ids)) + 1
+    group_material_ids = sorted_material_ids[np.concatenate(([0], group_starts))] if material_ids.size else []
+
+    for material_id, group in zip(group_material_ids, np.split(triangle_order, group_starts)):
+        g_material_id = None
+        if material_id < len(mesh_data.materials):
+            g_material_id = materials.find(mesh_data.materials[material_id])
+        if g_material_id is None:
+            g_material_id = 0
+
+        meshes.extend(_convert_triangles(polygons[group], positions, normals, uvs, g_material_id,
+                                         types_flags, mesh_flags, tolerance, position_bounds))
+    return meshes
+
+
+def _convert_triangles(material_polygons: np.ndarray, positions: np.ndarray, normals: np.ndarray, uvs: np.ndarray,
+                       material_id: int, attribute_flags: dict[VertexAttributeType, VertexAttributeFlags],
+                       mesh_flags: MeshFlags, tolerance: WeldTolerance,
+                       position_bounds: Optional[np.ndarray] = None) -> list[Mesh]:
+    """Builds meshes for triangles of one material, splitting them while any attribute pool exceeds 16 bit indices"""
+    unique_vertex_indices, inverse_indices = np.unique(material_polygons, return_inverse=True)
+
+    unique_positions, positions_inverse = weld(positions[unique_vertex_indices], tolerance.position)
+    unique_normals, normals_inverse = weld(normals[unique_vertex_indices], tolerance.normal)
+    unique_uvs, uvs_inverse = weld(uvs[unique_vertex_indices], tolerance.uv)
+
+    pool_size = max(unique_positions.shape[0], unique_normals.shape[0], unique_uvs.shape[0])
+    if pool_size > MAX_USHORT_POOL_SIZE:
+        half = material_polygons.shape[0] // 2
+        return (_convert_triangles(material_polygons[:half], positions, normals, uvs, material_id,
+                                   attribute_flags, mesh_flags, tolerance, position_bounds) +
+                _convert_triangles(material_polygons[half:], positions, normals, uvs, material_id,
+                                   attribute_flags, mesh_flags, tolerance, position_bounds))
+
+    remapped_polygons = inverse_indices.reshape(material_polygons.shape)
+
+    attributes = [
+        VertexAttribute(VertexAttributeType.POSITION, attribute_flags[VertexAttributeType.POSITION], unique_positions,
+                        bounds=position_bounds),
+        VertexAttribute(VertexAttributeType.UV, attribute_flags[VertexAttributeType.UV], unique_uvs),
+        VertexAttribute(VertexAttributeType.NORMAL, attribute_flags[VertexAttributeType.NORMAL], unique_normals),
+    ]
+
+    use_short_indices = pool_size > MAX_UBYTE_POOL_SIZE
+
+    indices = np.zeros((material_polygons.shape[0], 3, len(attributes)),
+                       np.uint16 if use_short_indices else np.uint8)
+
+    indices[:, :, VertexAttributeType.POSITION] = positions_inverse.ravel()[remapped_polygons]
+    indices[:, :, VertexAttributeType.UV] = uvs_inverse.ravel()[remapped_polygons]
+    indices[:, :, VertexAttributeType.NORMAL] = normals_inverse.ravel()[remapped_polygons]
+
+    if use_short_indices:
+        mesh_flags |= MeshFlags.USHORT_INDICES
+
+    return [Mesh(material_id, mesh_flags, attributes, indices)]
+
+
+def optimize_meshes_vertex_cache(meshes: list[Mesh]) -> tuple[list[Mesh], VertexCacheStats, VertexCacheStats]:
+    """Reorders triangles of every mesh for vertex cache locality, returns meshes and total stats before and after"""
+    optimized = []
+    total_before = total_after = VertexCacheStats(0, 0, 0)
+    for mesh in meshes:
+        mesh, before, after = optimize_mesh_vertex_cache(mesh)
+        optimized.append(mesh)
+        total_before += before
+        total_after += after
+    return optimized, total_before, total_after
+
+
+def optimize_meshes_vertex_fetch(meshes: list[Mesh]) -> tuple[list[Mesh], VertexFetchStats, VertexFetchStats]:
+    """Renumbers attribute pools of every mesh in first use order, returns meshes and total stats before and after"""
+    optimized = [optimize_vertex_fetch(mesh) for mesh in meshes]
+    before = sum(map(measure_vertex_fetch, meshes), VertexFetchStats(0, 0))
+    after = sum(map(measure_vertex_fetch, optimized), VertexFetchStats(0, 0))
+    return optimized, before, after
+
+
+def _attribute_encodings(options: ExportOptions) -> dict[VertexAttributeType, AttributeEncoding]:
+    return {
+        VertexAttributeType.POSITION: options.position_encoding,
+        VertexAttributeType.UV: options.uv_encoding,
+        VertexAttributeType.NORMAL: options.normal_encoding,
+    }
+
+
+def convert_object_meshes(arrays: list[np.ndarray], material_names: list[str], materials: MaterialTable,
+                          options: ExportOptions = ExportOptions()) -> list[Mesh]:
+    """Welds, converts and optionally optimizes meshes of one object from arrays of collect_mesh_arrays.
+    Stats of the optimization passes are summed up in the active profiler."""
+    with phase("weld", sum(array.nbytes for array in arrays)):
+        mesh_data = extract_intermediate_mesh(*arrays, material_names, options.tolerance)
+    with phase("material split"):
+        meshes = convert_to_vec3_meshes(mesh_data, materials, options.compress, options.tolerance,
+                                        options.filter_blocks, options.codec, _attribute_encodings(options))
+    if options.optimize_vertex_cache:
+        with phase("vertex cache"):
+            meshes, before, after = optimize_meshes_vertex_cache(meshes)
+        add_stats("vertex cache", before, after)
+    if options.optimize_vertex_fetch:
+        with phase("vertex fetch"):
+            meshes, before, after = optimize_meshes_vertex_fetch(meshes)
+        add_stats("vertex fetch", before, after)
+    return meshes
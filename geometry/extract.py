@@ -0,0 +1,55 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from voxel_core_model.geometry.weld import WeldTolerance, weld
+
+
+@dataclass(slots=True)
+class IntermediateMesh:
+    positions: np.ndarray = field(default_factory=lambda: np.empty((0, 3), np.float32))
+    normals: np.ndarray = field(default_factory=lambda: np.empty((0, 3), np.float32))
+    uvs: np.ndarray = field(default_factory=lambda: np.empty((0, 2), np.float32))
+    polygons: np.ndarray = field(default_factory=lambda: np.empty((0, 3), np.uint32))
+    material_ids: np.ndarray = field(default_factory=lambda: np.empty((0,), np.uint32))
+    materials: list[str] = field(default_factory=list)
+
+
+def extract_intermediate_mesh(vertex_positions: np.ndarray, loop_vertex_indices: np.ndarray,
+                              loop_normals: np.ndarray, loop_uvs: np.ndarray,
+                              triangle_loops: np.ndarray, triangle_material_ids: np.ndarray,
+                              material_names: list[str],
+                              tolerance: Optional[WeldTolerance] = None) -> IntermediateMesh:
+    """Builds welded triangle data from flat mesh arrays, as returned by foreach_get.
+
+    vertex_positions: 3 floats per vertex, loop_vertex_indices, loop_normals (3 floats) and
+    loop_uvs (2 floats) are per loop, triangle_loops holds 3 loop indices per triangle.
+    Corners are welded on position, normal and uv, optionally within tolerance.
+    """
+    positions = np.asarray(vertex_positions, np.float32).reshape(-1, 3)
+    loop_vertex_indices = np.asarray(loop_vertex_indices).ravel()
+    normals = np.asarray(loop_normals, np.float32).reshape(-1, 3)
+    uvs = np.asarray(loop_uvs, np.float32).reshape(-1, 2)
+    loops = np.asarray(triangle_loops).ravel()
+    n_tris = loops.shape[0] // 3
+
+    data = np.empty((loops.shape[0], 8), np.float32)
+    data[:, 0:3] = positions[loop_vertex_indices[loops]]
+    data[:, 3:6] = normals[loops]
+    data[:, 6:8] = uvs[loops]
+
+    if tolerance is not None:
+        column_tolerance = [tolerance.position] * 3 + [tolerance.normal] * 3 + [tolerance.uv] * 2
+    else:
+        column_tolerance = None
+    uniq, inv = weld(data, column_tolerance)
+
+    return IntermediateMesh(
+        uniq[:, :3],
+        uniq[:, 3:6],
+        uniq[:, 6:8],
+        inv.reshape(n_tris, 3).astype(np.uint32),
+        np.asarray(triangle_material_ids, np.uint32).ravel(),
+        material_names
+    )
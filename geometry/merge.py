@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from voxel_core_model.model.mesh import Mesh
+
+
+@dataclass(slots=True)
+class MergedMesh:
+    attributes: list[np.ndarray]
+    indices: np.ndarray
+    triangle_counts: np.ndarray
+
+
+def merge_meshes(meshes: list[Mesh]) -> MergedMesh:
+    """Concatenates attribute pools and index triplets of meshes sharing the same attribute layout.
+
+    Indices of every mesh are shifted by the pool sizes of the meshes before it,
+    all outputs are allocated once, so cost is linear in total size.
+    """
+    if not meshes:
+        raise ValueError("Nothing to merge")
+    attribute_types = [attribute.type for attribute in meshes[0].attributes]
+    for mesh in meshes:
+        if [attribute.type for attribute in mesh.attributes] != attribute_types:
+            raise NotImplementedError("All meshes in submodel must have same number and order of attributes")
+
+    attribute_count = len(attribute_types)
+    pool_sizes = np.array([[attribute.data.shape[0] for attribute in mesh.attributes] for mesh in meshes],
+                          np.uint32).reshape(len(meshes), attribute_count)
+    pool_offsets = np.cumsum(pool_sizes, axis=0, dtype=np.uint32) - pool_sizes
+    triangle_counts = np.array([mesh.triangle_count for mesh in meshes], np.uint32)
+    triangle_offsets = np.cumsum(triangle_counts) - triangle_counts
+
+    indices = np.empty((int(triangle_counts.sum()), 3, attribute_count), np.uint32)
+    for mesh, pool_offset, triangle_offset, triangle_count in zip(meshes, pool_offsets, triangle_offsets,
+                                                                   triangle_counts):
+        np.add(mesh.indices, pool_offset, out=indices[triangle_offset:triangle_offset + triangle_count])
+
+    attributes = [np.concatenate([mesh.attributes[i].data for mesh in meshes]) for i in range(attribute_count)]
+    return MergedMesh(attributes, indices, triangle_counts)
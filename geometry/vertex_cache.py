@@ -0,0 +1,148 @@
+"""Post-transform vertex cache optimisation, after Tom Forsyth's "Linear-Speed Vertex Cache Optimisation"."""
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from voxel_core_model.model.mesh import Mesh
+
+CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+@dataclass(slots=True, frozen=True)
+class VertexCacheStats:
+    misses: int
+    triangles: int
+    vertices: int
+
+    @property
+    def acmr(self) -> float:
+        """Average cache miss ratio, vertex shader runs per triangle"""
+        return self.misses / self.triangles if self.triangles else 0.0
+
+    @property
+    def atvr(self) -> float:
+        """Average transformed vertex ratio, vertex shader runs per unique vertex"""
+        return self.misses / self.vertices if self.vertices else 0.0
+
+    def __str__(self):
+        return f"ACMR {self.acmr:.3f}, ATVR {self.atvr:.3f}"
+
+    def __add__(self, other: 'VertexCacheStats') -> 'VertexCacheStats':
+        return VertexCacheStats(self.misses + other.misses, self.triangles + other.triangles,
+                                self.vertices + other.vertices)
+
+
+def mesh_vertex_ids(mesh: Mesh) -> tuple[np.ndarray, int]:
+    """Returns (triangles, 3) array of vertex ids, where a vertex is a unique combination of attribute indices"""
+    corners = np.asarray(mesh.indices).reshape(-1, len(mesh.attributes)).astype(np.int64)
+    radixes = [int(column.max(initial=0)) + 1 for column in corners.T]
+    if np.prod(radixes, dtype=object) >= 1 << 63:
+        unique_corners, vertex_ids = np.unique(corners, axis=0, return_inverse=True)
+        return vertex_ids.reshape(-1, 3), unique_corners.shape[0]
+    keys = np.zeros(corners.shape[0], np.int64)
+    for column, radix in zip(corners.T, radixes):
+        keys = keys * radix + column
+    unique_keys, vertex_ids = np.unique(keys, return_inverse=True)
+    return vertex_ids.reshape(-1, 3), unique_keys.shape[0]
+
+
+def measure_vertex_cache(triangles: np.ndarray, vertex_count: int, cache_size: int = CACHE_SIZE) -> VertexCacheStats:
+    """Simulates a FIFO post-transform cache of cache_size entries"""
+    inserted_at = [-cache_size - 1] * vertex_count
+    misses = 0
+    for vertex in triangles.ravel().tolist():
+        if misses - inserted_at[vertex] > cache_size:
+            inserted_at[vertex] = misses
+            misses += 1
+    return VertexCacheStats(misses, triangles.shape[0], vertex_count)
+
+
+def optimize_vertex_cache(triangles: np.ndarray, vertex_count: int, cache_size: int = CACHE_SIZE) -> np.ndarray:
+    """Returns triangle order that keeps recently used vertices in cache"""
+    triangle_count = triangles.shape[0]
+    if triangle_count == 0:
+        return np.empty(0, np.int64)
+
+    flat = triangles.ravel()
+    live = np.bincount(flat, minlength=vertex_count)
+    starts = (np.cumsum(live) - live).tolist()
+    # Per vertex adjacency, triangles of a vertex are kept in its [start, start + live) range
+    adjacency = (np.argsort(flat, kind="stable") // 3).tolist()
+    live = live.tolist()
+    tris = triangles.tolist()
+
+    cache_scores = [0.0] * (cache_size + 1)
+    for position in range(cache_size):
+        if position < 3:
+            cache_scores[position] = LAST_TRIANGLE_SCORE
+        else:
+            cache_scores[position] = (1 - (position - 3) / (cache_size - 3)) ** CACHE_DECAY_POWER
+    max_valence = max(live)
+    valence_scores = [0.0] + [VALENCE_BOOST_SCALE * valence ** -VALENCE_BOOST_POWER
+                              for valence in range(1, max_valence + 1)]
+
+    cache_position = [cache_size] * vertex_count
+    vertex_scores = [valence_scores[valence] for valence in live]
+    emitted = bytearray(triangle_count)
+    order = []
+    cache = []
+    scan = 0
+
+    scores = np.asarray(vertex_scores)[triangles].sum(axis=1)
+    best = int(scores.argmax())
+    while True:
+        if best < 0:
+            while scan < triangle_count and emitted[scan]:
+                scan += 1
+            if scan == triangle_count:
+                break
+            best = scan
+
+        emitted[best] = 1
+        order.append(best)
+        triangle = tris[best]
+        for vertex in triangle:
+            start = starts[vertex]
+            end = start + live[vertex] - 1
+            index = adjacency.index(best, start, end + 1)
+            adjacency[index], adjacency[end] = adjacency[end], adjacency[index]
+            live[vertex] -= 1
+
+        new_cache = triangle + [vertex for vertex in cache if vertex not in triangle]
+        for vertex in new_cache[cache_size:]:
+            cache_position[vertex] = cache_size
+            vertex_scores[vertex] = valence_scores[live[vertex]]
+        cache = new_cache[:cache_size]
+
+        for position, vertex in enumerate(cache):
+            cache_position[vertex] = position
+            if live[vertex]:
+                vertex_scores[vertex] = cache_scores[position] + valence_scores[live[vertex]]
+            else:
+                vertex_scores[vertex] = -1.0
+
+        best, best_score = -1, -1.0
+        for vertex in cache:
+            start = starts[vertex]
+            for candidate in adjacency[start:start + live[vertex]]:
+                a, b, c = tris[candidate]
+                score = vertex_scores[a] + vertex_scores[b] + vertex_scores[c]
+                if score > best_score:
+                    best, best_score = candidate, score
+    return np.asarray(order, np.int64)
+
+
+def optimize_mesh_vertex_cache(mesh: Mesh, cache_size: int = CACHE_SIZE
+                               ) -> tuple[Mesh, VertexCacheStats, VertexCacheStats]:
+    """Reorders mesh triangles for vertex cache locality, returns new mesh and cache stats before and after"""
+    triangles, vertex_count = mesh_vertex_ids(mesh)
+    before = measure_vertex_cache(triangles, vertex_count, cache_size)
+    order = optimize_vertex_cache(triangles, vertex_count, cache_size)
+    after = measure_vertex_cache(triangles[order], vertex_count, cache_size)
+    if after.misses >= before.misses:
+        return mesh, before, before
+    return replace(mesh, _indices=np.ascontiguousarray(mesh.indices[order])), before, after
@@ -0,0 +1,69 @@
+"""Vertex fetch optimisation, attribute pools are renumbered in the order triangles first use them."""
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from voxel_core_model.model.mesh import Mesh
+
+CACHE_LINE_SIZE = 64
+CACHE_LINE_COUNT = 16
+
+
+@dataclass(slots=True, frozen=True)
+class VertexFetchStats:
+    bytes_fetched: int  # bytes loaded through the simulated cache while walking indices in order
+    bytes_total: int  # size of all attribute pools
+
+    @property
+    def overfetch(self) -> float:
+        """Fetched bytes per attribute byte, 1.0 means every pool byte is read exactly once"""
+        return self.bytes_fetched / self.bytes_total if self.bytes_total else 0.0
+
+    def __str__(self):
+        return f"overfetch {self.overfetch:.3f}"
+
+    def __add__(self, other: 'VertexFetchStats') -> 'VertexFetchStats':
+        return VertexFetchStats(self.bytes_fetched + other.bytes_fetched, self.bytes_total + other.bytes_total)
+
+
+def measure_vertex_fetch(mesh: Mesh) -> VertexFetchStats:
+    """Simulates a small FIFO cache of cache lines for each attribute stream"""
+    corners = np.asarray(mesh.indices).reshape(-1, len(mesh.attributes))
+    bytes_fetched = bytes_total = 0
+    for column, attribute in zip(corners.T, mesh.attributes):
+        stride = attribute.data.strides[0]
+        bytes_total += attribute.data.nbytes
+        lines = (column.astype(np.int64) * stride // CACHE_LINE_SIZE)
+        # Consecutive corners on the same line never miss, drop them before the slow loop
+        lines = lines[np.concatenate(([True], lines[1:] != lines[:-1]))].tolist()
+        inserted_at: dict[int, int] = {}
+        misses = 0
+        for line in lines:
+            if misses - inserted_at.get(line, -CACHE_LINE_COUNT - 1) > CACHE_LINE_COUNT:
+                inserted_at[line] = misses
+                misses += 1
+        bytes_fetched += misses * CACHE_LINE_SIZE
+    return VertexFetchStats(bytes_fetched, bytes_total)
+
+
+def first_use_order(column: np.ndarray, pool_size: int) -> np.ndarray:
+    """Returns pool entries ordered by first reference in column, unreferenced entries go last"""
+    used, first_use = np.unique(column, return_index=True)
+    order = used[np.argsort(first_use, kind="stable")]
+    unused = np.setdiff1d(np.arange(pool_size), used, assume_unique=True)
+    return np.concatenate((order, unused))
+
+
+def optimize_vertex_fetch(mesh: Mesh) -> Mesh:
+    """Renumbers every attribute pool in first use order and remaps indices to match"""
+    corners = np.asarray(mesh.indices).reshape(-1, len(mesh.attributes))
+    remapped = np.empty_like(corners)
+    attributes = []
+    for i, attribute in enumerate(mesh.attributes):
+        pool_size = attribute.data.shape[0]
+        new_to_old = first_use_order(corners[:, i], pool_size)
+        old_to_new = np.empty(pool_size, corners.dtype)
+        old_to_new[new_to_old] = np.arange(pool_size, dtype=corners.dtype)
+        remapped[:, i] = old_to_new[corners[:, i]]
+        attributes.append(replace(attribute, _data=np.ascontiguousarray(attribute.data[new_to_old])))
+    return replace(mesh, attributes=attributes, _indices=remapped.reshape(mesh.indices.shape))
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+_HASH_SEED = np.uint64(0xCBF29CE484222325)
+_HASH_PRIME = np.uint64(0x100000001B3)
+
+
+@dataclass(slots=True, frozen=True)
+class WeldTolerance:
+    """Per attribute quantization step, rows falling into the same cell are merged. 0 means exact match"""
+    position: float = 0.0
+    normal: float = 0.0
+    uv: float = 0.0
+
+
+def weld(data: np.ndarray, tolerance: Optional[float | Sequence[float] | np.ndarray] = None
+         ) -> tuple[np.ndarray, np.ndarray]:
+    """Merges duplicate rows of a 2D float array using a vectorized open addressing hash table.
+
+    Returns unique rows in first occurrence order and inverse indices, so that unique[inverse] == data
+    (up to tolerance). tolerance is a scalar or one value per column, rows are compared by
+    round(value / tolerance), columns with zero tolerance are compared exactly.
+    """
+    data = np.asarray(data, np.float32)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    row_count = data.shape[0]
+    if row_count == 0:
+        return data.copy(), np.empty(0, np.uint32)
+
+    keys = _quantize(data, tolerance)
+    hashes = _hash_rows(keys)
+
+    table_size = 1 << int(2 * row_count - 1).bit_length()
+    mask = np.uint64(table_size - 1)
+    table = np.full(table_size, -1, np.int64)
+    representative = np.empty(row_count, np.int64)
+
+    pending = np.arange(row_count, dtype=np.int64)
+    slots = (hashes & mask).astype(np.int64)
+    while pending.size:
+        pending_slots = slots[pending]
+        # Free slots are claimed by the lowest pending row, so duplicates resolve to their first occurrence
+        free = table[pending_slots] == -1
+        table[pending_slots[free][::-1]] = pending[free][::-1]
+        owners = table[pending_slots]
+        matched = (keys[owners] == keys[pending]).all(axis=1)
+        representative[pending[matched]] = owners[matched]
+        pending = pending[~matched]
+        slots[pending] = (slots[pending] + 1) & (table_size - 1)
+
+    is_unique = representative == np.arange(row_count)
+    new_index = np.cumsum(is_unique, dtype=np.int64) - 1
+    inverse = new_index[representative].astype(np.uint32)
+    return data[is_unique], inverse
+
+
+def _quantize(data: np.ndarray, tolerance) -> np.ndarray:
+    # +0.0 folds negative zero into zero, so bit patterns of equal values match
+    exact_keys = (data + np.float32(0)).view(np.uint32).astype(np.int64)
+    if tolerance is None:
+        return exact_keys
+    tolerance = np.broadcast_to(np.asarray(tolerance, np.float64), (data.shape[1],))
+    if not tolerance.any():
+        return exact_keys
+    quantized = np.floor(data / np.where(tolerance > 0, tolerance, 1) + 0.5).astype(np.int64)
+    return np.where(tolerance > 0, quantized, exact_keys)
+
+
+def _hash_rows(keys: np.ndarray) -> np.ndarray:
+    hashes = np.full(keys.shape[0], _HASH_SEED, np.uint64)
+    for column in keys.T:
+        hashes ^= column.astype(np.uint64)
+        hashes *= _HASH_PRIME
+    # splitmix64 finalizer, spreads high bits into the low bits used for slot selection
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(0xFF51AFD7ED558CCD)
+    hashes ^= hashes >> np.uint64(33)
+    hashes *= np.uint64(0xC4CEB9FE1A85EC53)
+    hashes ^= hashes >> np.uint64(33)
+    return hashes
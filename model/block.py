@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class EncodedBlock:
+    """Vertex attribute or index payload exactly as it is stored in the file."""
+    flags: int
+    payload: bytes | memoryview
+    decoded_size: int
+    offset: int = -1
+
+    @property
+    def size(self) -> int:
+        return len(self.payload)
@@ -1,9 +1,20 @@
-from dataclasses import dataclass
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
 
-from voxel_core_model.file_utils import Buffer, FileBuffer
+from voxel_core_model.file_utils import Buffer, MappedFileBuffer
 from voxel_core_model.model.material import Material
+from voxel_core_model.model.mesh import Mesh, MeshFlags, MESH_CODEC_MASK
 from voxel_core_model.model.model import Model
+from voxel_core_model.model.schema import BODY, HEADER
+from voxel_core_model.model.validate import ValidationError, check_models, decode_checked
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, ATTRIBUTE_CODEC_MASK, \
+    ATTRIBUTE_ENCODING_MASK
+from voxel_core_model.profiling import phase
+
+SUPPORTED_VERSIONS = (1, 2, 3)
+IDENT = b"\x00\x00VEC3\x00\x00"
 
 
 @dataclass(slots=True, frozen=True)
@@ -12,37 +23,266 @@ class Body:
     materials: list[Material]
 
     @classmethod
-    def from_buffer(cls, buffer: Buffer):
-        material_count, model_count = buffer.read_fmt("2H")
+    def from_buffer(cls, buffer: Buffer, lazy: bool = False, version: int = SUPPORTED_VERSIONS[-1]):
+        """version is the one read from the file header, instance models are only accepted from version 3"""
+        material_count, model_count = BODY.read(buffer)
         materials = [Material.from_buffer(buffer) for _ in range(material_count)]
-        models = [Model.from_buffer(buffer) for _ in range(model_count)]
+        models = []
+        for _ in range(model_count):
+            models.append(_resolve_instance(Model.from_buffer(buffer, lazy), models, version))
         return cls(models, materials)
 
-    def to_buffer(self, buffer: Buffer):
-        buffer.write_fmt("2H", len(self.materials), len(self.models))
+    def to_buffer(self, buffer: Buffer, compression_level: int = 9):
+        BODY.write(buffer, len(self.materials), len(self.models))
         for material in self.materials:
             material.to_buffer(buffer)
         for model in self.models:
-            model.to_buffer(buffer)
+            model.to_buffer(buffer, compression_level)
 
 
-def load_model_from_buffer(buffer: Buffer) -> Body:
-    ident = buffer.read(8)
-    if ident != b"\x00\x00VEC3\x00\x00":
-        raise ValueError(f"Invalid header. Invalid identifier, expected b\"\x00\x00VEC3\x00\x00\", but got {ident}.")
-    version, _ = buffer.read_fmt("2H")
-    if version != 1:
-        raise ValueError(f"Invalid header. Unsupported version, expected 1, but got {version}.")
-    return Body.from_buffer(buffer)
+def decode_body(body: Body, workers: Optional[int] = None, keep_blocks: bool = True, validate: bool = False) -> Body:
+    """Decode all pending payloads of a lazily loaded body, compressed blocks are inflated on a thread pool.
+    With validate=True decoding failures are raised as ValidationError naming the block."""
+
+    def decode(item: VertexAttribute | Mesh):
+        return decode_checked(item, keep_blocks) if validate else item.decode(keep_blocks)
+
+    compressed: list[VertexAttribute | Mesh] = []
+    for model in body.models:
+        if model.is_instance:
+            continue
+        for mesh in model.meshes:
+            for item in (*mesh.attributes, mesh):
+                if item.is_loaded:
+                    continue
+                if isinstance(item, Mesh):
+                    is_compressed = item.block.flags & MeshFlags.GZIP
+                else:
+                    is_compressed = item.block.flags & VertexAttributeFlags.GZIP
+                if is_compressed:
+                    compressed.append(item)
+                else:
+                    decode(item)
+    if len(compressed) > 1 and workers != 1:
+        with ThreadPoolExecutor(workers) as pool:
+            map_blocks(decode, compressed, pool)
+    else:
+        map_blocks(decode, compressed)
+    return body
+
+
+def map_blocks(func: Callable, items: list, pool: Optional[Executor] = None) -> list:
+    """Applies func to every item on pool, or serially without one"""
+    if pool is None or len(items) < 2:
+        return [func(item) for item in items]
+    # zlib, lzma and zstd release the GIL while (de)compressing, so threads process blocks in parallel
+    return list(pool.map(func, items))
+
+
+def encode_meshes(meshes: list[Mesh], compression_level: int = 9, pool: Optional[Executor] = None) -> list[Mesh]:
+    """Returns copies of meshes that hold only their encoded blocks, decoded data is dropped"""
+
+    def encode(item: VertexAttribute | Mesh):
+        # A copy holding decoded data next to the block would discard the block again
+        if isinstance(item, Mesh):
+            return replace(item, _indices=None, _block=item.encode(compression_level))
+        return replace(item, _data=None, _block=item.encode(compression_level))
+
+    attributes = [attribute for mesh in meshes for attribute in mesh.attributes]
+    encoded_attributes = iter(map_blocks(encode, attributes, pool))
+    return [replace(mesh, attributes=[next(encoded_attributes) for _ in mesh.attributes])
+            for mesh in map_blocks(encode, meshes, pool)]
+
+
+def encode_models(models: list[Model], compression_level: int = 9, pool: Optional[Executor] = None) -> list[Model]:
+    """Returns copies of models where every attribute and mesh carries its encoded block"""
+    # Instance models are written without meshes
+    meshes = [mesh for model in models if not model.is_instance for mesh in model.meshes]
+    encoded_meshes = iter(encode_meshes(meshes, compression_level, pool))
+    return [model if model.is_instance else replace(model, meshes=[next(encoded_meshes) for _ in model.meshes])
+            for model in models]
+
+
+def encode_body(body: Body, compression_level: int = 9, workers: Optional[int] = None) -> Body:
+    """Returns a copy of body where every attribute and mesh carries its encoded block,
+    with workers != 1 compressed blocks are produced on a thread pool"""
+    if workers == 1:
+        return replace(body, models=encode_models(body.models, compression_level))
+    with ThreadPoolExecutor(workers) as pool:
+        return replace(body, models=encode_models(body.models, compression_level, pool))
+
+
+class BodyWriter:
+    """Writes models as they are produced, model count in the Body header is patched on close"""
+
+    def __init__(self, buffer: Buffer, materials: list[Material], compression_level: int = 9,
+                 workers: Optional[int] = 1):
+        self.buffer = buffer
+        self.materials = materials
+        self.compression_level = compression_level
+        self.model_count = 0
+        self.version = 1
+        self._pool = ThreadPoolExecutor(workers) if workers != 1 else None
+
+        self._header_offset = buffer.tell()
+        _write_header(buffer)
+        self._count_offset = buffer.tell()
+        BODY.write(buffer, len(materials), 0)
+        for material in materials:
+            material.to_buffer(buffer)
+
+    def write_model(self, model: Model):
+        if self.model_count == 0xFFFF:
+            raise ValueError("Too many models, only 65535 models per file are supported")
+        model, = encode_models([model], self.compression_level, self._pool)
+        with phase("write"):
+            model.to_buffer(self.buffer, self.compression_level)
+        self.model_count += 1
+        self.version = max(self.version, required_version([model]))
+
+    def close(self):
+        self._shutdown_pool()
+        with self.buffer.save_current_offset():
+            self.buffer.seek(self._header_offset)
+            _write_header(self.buffer, self.version)
+            self.buffer.seek(self._count_offset)
+            BODY.write(self.buffer, len(self.materials), self.model_count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # A failed export keeps the model count at 0 instead of passing off the models written so far as a body
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown_pool()
 
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
-def load_model_from_path(path: Path) -> Body:
-    with FileBuffer(path, "rb") as f:
-        return load_model_from_buffer(f)
 
+def required_version(models: Iterable[Model]) -> int:
+    """Oldest format version able to hold models. Filtered blocks, codecs other than gzip and quantized
+    attribute encodings need version 2, instance models version 3."""
+    version = 1
+    for model in models:
+        if model.is_instance:
+            return 3
+        for mesh in model.meshes:
+            if mesh.flags & (MeshFlags.FILTERED | MESH_CODEC_MASK) or any(
+                    attribute.flags & (VertexAttributeFlags.FILTERED | ATTRIBUTE_CODEC_MASK | ATTRIBUTE_ENCODING_MASK)
+                    for attribute in mesh.attributes):
+                version = 2
+    return version
 
-def write_model_to_buffer(buffer: Buffer, model: Body) -> Buffer:
-    buffer.write(b"\x00\x00VEC3\x00\x00")
-    buffer.write_uint32(1)
-    model.to_buffer(buffer)
+
+def load_model_from_buffer(buffer: Buffer, lazy: bool = False, workers: Optional[int] = 1,
+                           validate: bool = False, check_indices: bool = True) -> Body:
+    """With lazy=True payloads are only located, attribute data and indices are decoded on first access.
+    Payloads are kept as views, so lazy loading pays off on memory backed buffers (MappedFileBuffer).
+    With workers != 1 compressed payloads are decompressed on a thread pool (None picks the pool default).
+    With validate=True block sizes, flags, materials and index ranges (unless check_indices=False) of untrusted
+    files are checked before attribute data is decoded. Every parse or decode failure is raised as
+    ValidationError, lazily loaded payloads are only checked once decoded."""
+    # Parsing only locates payloads, decompression is recorded separately while decoding
+    with phase("parse", buffer.size()):
+        if validate:
+            body = _scan_validated(buffer)
+        else:
+            body = Body.from_buffer(buffer, lazy=True, version=_read_header(buffer))
+    if validate:
+        with phase("validate"):
+            check_models(body.models, body.materials, check_indices)
+    return body if lazy else decode_body(body, workers, keep_blocks=False, validate=validate)
+
+
+class BodyReader:
+    """Reads the material table up front, then yields models one at a time without keeping earlier ones.
+    Version 3 files may contain instance models, there earlier models are kept to resolve them."""
+
+    def __init__(self, buffer: Buffer, lazy: bool = False):
+        self.buffer = buffer
+        self.lazy = lazy
+        self.version = _read_header(buffer)
+        material_count, self.model_count = BODY.read(buffer)
+        self.materials = [Material.from_buffer(buffer) for _ in range(material_count)]
+
+    def __iter__(self) -> Iterator[Model]:
+        models: Optional[list[Model]] = [] if self.version >= 3 else None
+        for _ in range(self.model_count):
+            model = _resolve_instance(Model.from_buffer(self.buffer, self.lazy), models, self.version)
+            if models is not None:
+                models.append(model)
+            yield model
+
+
+def iter_models(buffer: Buffer, lazy: bool = False) -> Iterator[Model]:
+    """Streaming counterpart of load_model_from_buffer, use BodyReader when the material table is needed too"""
+    yield from BodyReader(buffer, lazy)
+
+
+def load_model_from_path(path: Path, lazy: bool = False, workers: Optional[int] = 1, validate: bool = False,
+                         check_indices: bool = True) -> Body:
+    with MappedFileBuffer(path) as f:
+        return load_model_from_buffer(f, lazy, workers, validate, check_indices)
+
+
+def write_model_to_buffer(buffer: Buffer, model: Body, compression_level: int = 9,
+                          workers: Optional[int] = 1) -> Buffer:
+    """All blocks are encoded before the serial write, with workers != 1 on a thread pool."""
+    model = encode_body(model, compression_level, workers)
+    with phase("write"):
+        _write_header(buffer, required_version(model.models))
+        model.to_buffer(buffer, compression_level)
     return buffer
+
+
+def write_models_to_buffer(buffer: Buffer, materials: list[Material], models: Iterable[Model],
+                           compression_level: int = 9, workers: Optional[int] = 1) -> Buffer:
+    """Streaming counterpart of write_model_to_buffer, each model is written as soon as it is produced.
+    Buffer has to be seekable, model count is patched in afterwards."""
+    with BodyWriter(buffer, materials, compression_level, workers) as writer:
+        for model in models:
+            writer.write_model(model)
+    return buffer
+
+
+def _resolve_instance(model: Model, models: Optional[list[Model]], version: int) -> Model:
+    """Shares meshes of the source model with an instance model, models holds models read so far.
+    Files older than version 3 can not contain instances, there models may be None."""
+    if not model.is_instance:
+        return model
+    if version < 3:
+        raise ValidationError([f"Model {model.name!r} is an instance, which needs version 3, "
+                               f"but the file is version {version}"])
+    if model.source >= len(models) or models[model.source].is_instance:
+        raise ValidationError([f"Model {model.name!r} refers to model {model.source}, "
+                               f"which is not an earlier mesh model"])
+    return replace(model, meshes=models[model.source].meshes)
+
+
+def _scan_validated(buffer: Buffer) -> Body:
+    """Lazily reads header and body of an untrusted file, parse failures are raised as ValidationError"""
+    try:
+        return Body.from_buffer(buffer, lazy=True, version=_read_header(buffer))
+    except ValidationError:
+        raise
+    except Exception as e:  # truncated or garbled headers surface as BufferError, struct.error or ValueError
+        raise ValidationError([f"Malformed data at offset {buffer.tell()}: {e}"]) from e
+
+
+def _read_header(buffer: Buffer):
+    ident, version, _ = HEADER.read(buffer)
+    if ident != IDENT:
+        raise ValueError(f"Invalid header. Invalid identifier, expected b\"\x00\x00VEC3\x00\x00\", but got {ident}.")
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Invalid header. Unsupported version, expected one of {SUPPORTED_VERSIONS}, "
+                         f"but got {version}.")
+    return version
+
+
+def _write_header(buffer: Buffer, version: int = 1):
+    HEADER.write(buffer, IDENT, version, 0)
@@ -0,0 +1,112 @@
+import gzip
+import lzma
+import zlib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable
+
+from voxel_core_model.profiling import add_bytes, phase
+
+
+class BlockCodec(IntEnum):
+    GZIP = 0
+    DEFLATE = 1
+    LZMA = 2
+    ZSTD = 3
+    LZ4 = 4
+
+
+@dataclass(slots=True, frozen=True)
+class Codec:
+    name: str
+    compress_func: Callable[[bytes, int], bytes]
+    decompress_func: Callable[[bytes, int], bytes]  # stops after output exceeds the given size
+    min_level: int
+    max_level: int
+
+    def compress(self, data, level: int) -> bytes:
+        with phase("compress", len(data)):
+            return self.compress_func(data, min(max(level, self.min_level), self.max_level))
+
+    def decompress(self, data, max_size: int) -> bytes:
+        """Blocks inflating beyond max_size, their declared size, are rejected before they are fully inflated"""
+        with phase("decompress"):
+            data = self.decompress_func(data, max_size)
+        if len(data) > max_size:
+            raise ValueError(f"Compressed block inflates beyond its declared size of {max_size} bytes")
+        add_bytes("decompress", len(data))
+        return data
+
+
+CODECS: dict[int, Codec] = {}
+
+
+def register_codec(codec_id: int, codec: Codec):
+    CODECS[codec_id] = codec
+
+
+def get_codec(codec_id: int) -> Codec:
+    codec = CODECS.get(codec_id)
+    if codec is None:
+        if codec_id in BlockCodec._value2member_map_:
+            raise ValueError(f"Block codec {BlockCodec(codec_id).name} is not available, required module is missing")
+        raise ValueError(f"Unknown block codec: {codec_id}")
+    return codec
+
+
+def bounded_decompress(decompressor, data, max_size: int) -> bytes:
+    """Runs a zlib, lzma or lz4 style decompressor object for at most max_size + 1 bytes of output"""
+    data = decompressor.decompress(data, max_length=max_size + 1)
+    if len(data) <= max_size and not decompressor.eof:
+        raise ValueError("Compressed block is truncated")
+    return data
+
+
+def _deflate_compress(data, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+register_codec(BlockCodec.GZIP, Codec(
+    "gzip", lambda data, level: gzip.compress(data, level),
+    lambda data, max_size: bounded_decompress(zlib.decompressobj(16 + zlib.MAX_WBITS), data, max_size), 0, 9))
+register_codec(BlockCodec.DEFLATE, Codec(
+    "deflate", _deflate_compress,
+    lambda data, max_size: bounded_decompress(zlib.decompressobj(-zlib.MAX_WBITS), data, max_size), 0, 9))
+register_codec(BlockCodec.LZMA, Codec(
+    "lzma", lambda data, level: lzma.compress(data, preset=level, check=lzma.CHECK_NONE),
+    lambda data, max_size: bounded_decompress(lzma.LZMADecompressor(), data, max_size), 0, 9))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _zstd_decompress(data, max_size: int) -> bytes:
+    """Reads at most max_size + 1 bytes instead of trusting the content size stored in the frame"""
+    chunks = []
+    remaining = max_size + 1
+    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+        while remaining > 0:
+            chunk = reader.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+if zstandard is not None:
+    register_codec(BlockCodec.ZSTD, Codec("zstd", lambda data, level: zstandard.ZstdCompressor(level).compress(data),
+                                          _zstd_decompress, 1, 22))
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+if lz4 is not None:
+    register_codec(BlockCodec.LZ4, Codec(
+        "lz4", lambda data, level: lz4.frame.compress(data, level),
+        lambda data, max_size: bounded_decompress(lz4.frame.LZ4FrameDecompressor(), data, max_size), 0, 16))
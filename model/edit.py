@@ -0,0 +1,56 @@
+"""Metadata edits on bodies that leave payloads alone.
+
+Meshes and attributes of lazily loaded bodies only hold their encoded blocks. The edits below never change
+block flags, so writing the result copies every payload verbatim without decompressing or re-encoding it.
+"""
+from dataclasses import replace
+from typing import Callable, Collection
+
+from voxel_core_model.model.body import Body
+from voxel_core_model.model.material import Material, MaterialTable
+from voxel_core_model.model.mesh import Mesh
+
+
+def rename_models(body: Body, names: dict[str, str]) -> Body:
+    """Renames models found in names, other models keep their name"""
+    return replace(body, models=[replace(model, name=names.get(model.name, model.name)) for model in body.models])
+
+
+def drop_models(body: Body, names: Collection[str]) -> Body:
+    """Removes models with given names. Instance sources are re-indexed, when the source of an instance is dropped
+    the first remaining instance takes over its meshes and later ones refer to that instance instead."""
+    models = []
+    new_indices: dict[int, int] = {}  # old model index to the new index of the model holding its meshes
+    for i, model in enumerate(body.models):
+        if model.name in names:
+            continue
+        if not model.is_instance:
+            new_indices[i] = len(models)
+            models.append(model)
+        elif model.source in new_indices:
+            models.append(replace(model, source=new_indices[model.source]))
+        else:
+            new_indices[model.source] = len(models)
+            models.append(replace(model, source=None))
+    return replace(body, models=models)
+
+
+def rename_materials(body: Body, names: dict[str, str]) -> Body:
+    """Renames materials found in names. Materials renamed to the name of another material are merged into it,
+    the first material of a name keeps its flags."""
+    materials = MaterialTable()
+    new_ids = [materials.add(Material(names.get(material.name, material.name), material.flags))
+               for material in body.materials]
+    return map_meshes(replace(body, materials=materials.materials),
+                      lambda mesh: replace(mesh, material_id=new_ids[mesh.material_id]))
+
+
+def map_meshes(body: Body, func: Callable[[Mesh], Mesh]) -> Body:
+    """Applies func to meshes of every non instance model, instance models are pointed at the new meshes"""
+    models = []
+    for model in body.models:
+        if model.is_instance:
+            models.append(replace(model, meshes=models[model.source].meshes))
+        else:
+            models.append(replace(model, meshes=[func(mesh) for mesh in model.meshes]))
+    return replace(body, models=models)
@@ -0,0 +1,30 @@
+"""Reversible pre-compression filters, they keep data size and only make it easier to deflate."""
+import numpy as np
+
+
+def delta_zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """Replaces each row of unsigned integer values with zigzag encoded difference to the previous row.
+    Differences wrap around the integer width, so encoded values keep the input dtype."""
+    deltas = np.diff(values, axis=0, prepend=np.zeros_like(values[:1]))
+    signed = deltas.view(deltas.dtype.str.replace("u", "i"))
+    bits = values.dtype.itemsize * 8
+    return ((signed << 1) ^ (signed >> (bits - 1))).view(values.dtype)
+
+
+def delta_zigzag_decode(values: np.ndarray) -> np.ndarray:
+    signed = values.view(values.dtype.str.replace("u", "i"))
+    deltas = ((values >> 1).view(signed.dtype) ^ -(signed & 1)).view(values.dtype)
+    return np.cumsum(deltas, axis=0, dtype=values.dtype)
+
+
+def byte_shuffle(data, item_size: int) -> bytes:
+    """Groups bytes by their position inside items: all first bytes, then all second bytes and so on"""
+    if item_size == 1:
+        return bytes(data)
+    return np.frombuffer(data, np.uint8).reshape(-1, item_size).T.tobytes()
+
+
+def byte_unshuffle(data, item_size: int) -> bytes:
+    if item_size == 1:
+        return bytes(data)
+    return np.frombuffer(data, np.uint8).reshape(item_size, -1).T.tobytes()
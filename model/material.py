@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from enum import IntFlag
+from typing import Optional
 
 from voxel_core_model.file_utils import Buffer
+from voxel_core_model.model.schema import MATERIAL
 
 
 class MaterialFlags(IntFlag):
@@ -16,12 +18,38 @@ class Material:
 
     @classmethod
     def from_buffer(cls, buffer: Buffer):
-        flags = MaterialFlags(buffer.read_uint16())
-        name = buffer.read_ascii_string(buffer.read_uint16())
-        return cls(name, flags)
+        flags, name_size = MATERIAL.read(buffer)
+        return cls(buffer.read_ascii_string(name_size), MaterialFlags(flags))
 
     def to_buffer(self, buffer: Buffer):
-        buffer.write_uint16(self.flags)
-        buffer.write_uint16(len(self.name))
+        MATERIAL.write(buffer, self.flags, len(self.name))
         buffer.write_ascii_string(self.name)
         return buffer
+
+
+class MaterialTable:
+    """Body material list with a name to index lookup"""
+
+    def __init__(self, materials: Optional[list[Material]] = None):
+        self.materials: list[Material] = materials if materials is not None else []
+        self._indices = {material.name: i for i, material in enumerate(self.materials)}
+
+    def find(self, name: str) -> Optional[int]:
+        return self._indices.get(name)
+
+    def add(self, material: Material) -> int:
+        """Adds material unless one with the same name is present, returns its index"""
+        index = self._indices.get(material.name)
+        if index is None:
+            index = self._indices[material.name] = len(self.materials)
+            self.materials.append(material)
+        return index
+
+    def __len__(self):
+        return len(self.materials)
+
+    def __iter__(self):
+        return iter(self.materials)
+
+    def __getitem__(self, index: int) -> Material:
+        return self.materials[index]
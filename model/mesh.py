@@ -1,17 +1,26 @@
-import gzip
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import IntFlag
+from typing import Optional
 
 import numpy as np
 
 from voxel_core_model.file_utils import Buffer
+from voxel_core_model.model.block import EncodedBlock
+from voxel_core_model.model.codec import BlockCodec, get_codec
+from voxel_core_model.model.filters import byte_shuffle, byte_unshuffle, delta_zigzag_decode, delta_zigzag_encode
+from voxel_core_model.model.schema import BLOCK_SIZE, MESH
 from voxel_core_model.model.vertex_attribute import VertexAttributeType, VertexAttribute
 
 
 class MeshFlags(IntFlag):
     NONE = 0
-    GZIP = 1
+    GZIP = 1  # indices are compressed, codec is selected by codec bits, 0 is gzip
     USHORT_INDICES = 2
+    FILTERED = 4
+
+
+MESH_CODEC_SHIFT = 3
+MESH_CODEC_MASK = 0b111 << MESH_CODEC_SHIFT
 
 
 @dataclass(slots=True, frozen=True)
@@ -19,41 +28,106 @@ class Mesh:
     material_id: int
     flags: MeshFlags
     attributes: list[VertexAttribute]
-    indices: np.ndarray
+    _indices: Optional[np.ndarray] = None
+    _block: Optional[EncodedBlock] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # Supplied indices supersede an encoded block, so encode() never writes the old payload for them
+        if self._indices is not None and self._block is not None:
+            object.__setattr__(self, "_block", None)
+
+    @property
+    def indices(self) -> np.ndarray:
+        """Index triplets, lazily loaded meshes are decoded on first access"""
+        if self._indices is None:
+            object.__setattr__(self, "_indices", self._decode(self._block, len(self.attributes)))
+        return self._indices
+
+    @property
+    def block(self) -> Optional[EncodedBlock]:
+        return self._block
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._indices is not None
+
+    def decode(self, keep_block: bool = True):
+        """Decode pending index payload now, optionally dropping the encoded block afterwards"""
+        self.indices
+        if not keep_block:
+            object.__setattr__(self, "_block", None)
+        return self
+
+    @property
+    def codec(self) -> BlockCodec:
+        return BlockCodec((self.flags & MESH_CODEC_MASK) >> MESH_CODEC_SHIFT)
+
+    @property
+    def triangle_count(self) -> int:
+        if self._indices is not None:
+            return self._indices.shape[0]
+        index_size = 2 if self._block.flags & MeshFlags.USHORT_INDICES else 1
+        return self._block.decoded_size // (3 * len(self.attributes) * index_size)
 
     @classmethod
-    def from_buffer(cls, buffer: Buffer) -> 'Mesh':
-        triangle_count, material_id, flags, attribute_count = buffer.read_fmt("I3H")
-        attributes = [VertexAttribute.from_buffer(buffer) for _ in range(attribute_count)]
+    def from_buffer(cls, buffer: Buffer, lazy: bool = False) -> 'Mesh':
+        triangle_count, material_id, flags, attribute_count = MESH.read(buffer)
+        attributes = [VertexAttribute.from_buffer(buffer, lazy) for _ in range(attribute_count)]
         expected_buffer_size = triangle_count * 3 * attribute_count
         if flags & MeshFlags.USHORT_INDICES:
             expected_buffer_size *= 2
         if flags & MeshFlags.GZIP:
-            compressed_size = buffer.read_uint32()
-            data = gzip.decompress(buffer.read(compressed_size))
-            if len(data) != expected_buffer_size:
+            compressed_size, = BLOCK_SIZE.read(buffer)
+            offset = buffer.tell()
+            block = EncodedBlock(flags, buffer.read_view(compressed_size), expected_buffer_size, offset)
+        else:
+            offset = buffer.tell()
+            block = EncodedBlock(flags, buffer.read_view(expected_buffer_size), expected_buffer_size, offset)
+        if lazy:
+            return cls(material_id, MeshFlags(flags), attributes, None, block)
+        return cls(material_id, MeshFlags(flags), attributes, cls._decode(block, attribute_count))
+
+    @staticmethod
+    def _decode(block: EncodedBlock, attribute_count: int) -> np.ndarray:
+        if block.flags & MeshFlags.GZIP:
+            codec = get_codec((block.flags & MESH_CODEC_MASK) >> MESH_CODEC_SHIFT)
+            data = codec.decompress(block.payload, block.decoded_size)
+            if len(data) != block.decoded_size:
                 raise ValueError(
-                    "Decompressed data size does not match: {}!={}".format(len(data), expected_buffer_size))
+                    "Decompressed data size does not match: {}!={}".format(len(data), block.decoded_size))
         else:
-            data = buffer.read(expected_buffer_size)
-        if flags & MeshFlags.USHORT_INDICES:
-            indices = np.frombuffer(data, dtype=np.uint16).reshape(-1, 3, attribute_count)
+            data = block.payload
+        index_type = np.uint16 if block.flags & MeshFlags.USHORT_INDICES else np.uint8
+        if block.flags & MeshFlags.FILTERED:
+            data = byte_unshuffle(data, np.dtype(index_type).itemsize)
+            indices = delta_zigzag_decode(np.frombuffer(data, dtype=index_type).reshape(-1, attribute_count))
+            return indices.reshape(-1, 3, attribute_count)
+        return np.frombuffer(data, dtype=index_type).reshape(-1, 3, attribute_count)
+
+    def encode(self, compression_level: int = 9) -> EncodedBlock:
+        """Returns index payload as it will be written, blocks that already match current flags are reused as is"""
+        if self._block is not None and self._block.flags == self.flags:
+            return self._block
+        index_type = np.uint16 if self.flags & MeshFlags.USHORT_INDICES else np.uint8
+        if self.flags & MeshFlags.FILTERED:
+            indices = np.ascontiguousarray(self.indices, index_type).reshape(-1, len(self.attributes))
+            indices = delta_zigzag_encode(indices)
+            data = byte_shuffle(indices, np.dtype(index_type).itemsize)
         else:
-            indices = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3, attribute_count)
-        return cls(material_id, MeshFlags(flags), attributes, indices)
+            data = memoryview(np.ascontiguousarray(self.indices, index_type)).cast("B")
+        if self.flags & MeshFlags.GZIP:
+            return EncodedBlock(self.flags, get_codec(self.codec).compress(data, compression_level), len(data))
+        return EncodedBlock(self.flags, data, len(data))
 
-    def to_buffer(self, buffer: Buffer) -> Buffer:
-        buffer.write_fmt("I3H", self.indices.shape[0], self.material_id,
-                         self.flags, len(self.attributes))
+    def to_buffer(self, buffer: Buffer, compression_level: int = 9) -> Buffer:
+        block = self.encode(compression_level)
+        MESH.write(buffer, self.triangle_count, self.material_id, self.flags, len(self.attributes))
         for attribute in self.attributes:
-            attribute.to_buffer(buffer)
+            attribute.to_buffer(buffer, compression_level)
 
         if self.flags & MeshFlags.GZIP:
-            data = gzip.compress(self.indices.tobytes())
-            buffer.write_uint32(len(data))
-            buffer.write(data)
-        else:
-            buffer.write(self.indices.tobytes())
+            BLOCK_SIZE.write(buffer, block.size)
+        buffer.write(block.payload)
 
         return buffer
 
@@ -1,7 +1,12 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from voxel_core_model.file_utils import Buffer
 from .mesh import Mesh
+from .schema import MODEL
+
+# Set in mesh_count of an instance model, lower bits are the index of the model whose meshes are shared
+MODEL_INSTANCE_FLAG = 0x80000000
 
 
 @dataclass(slots=True, frozen=True)
@@ -9,21 +14,29 @@ class Model:
     name: str
     origin: tuple[float, float, float]
     meshes: list[Mesh]
+    source: Optional[int] = None  # index of an earlier model in the body this one shares meshes with
+
+    @property
+    def is_instance(self) -> bool:
+        return self.source is not None
 
     @classmethod
-    def from_buffer(cls, buffer: Buffer):
-        name_size = buffer.read_uint16()
-        origin = buffer.read_fmt("3f")
-        mesh_count = buffer.read_uint32()
-        meshes = [Mesh.from_buffer(buffer) for _ in range(mesh_count)]
+    def from_buffer(cls, buffer: Buffer, lazy: bool = False):
+        """Meshes of instance models are left empty, Body resolves them from the source model"""
+        name_size, *origin, mesh_count = MODEL.read(buffer)
+        source = None
+        if mesh_count & MODEL_INSTANCE_FLAG:
+            source = mesh_count & ~MODEL_INSTANCE_FLAG
+            mesh_count = 0
+        meshes = [Mesh.from_buffer(buffer, lazy) for _ in range(mesh_count)]
         name = buffer.read_ascii_string(name_size)
-        return cls(name, origin, meshes)
+        return cls(name, tuple(origin), meshes, source)
 
-    def to_buffer(self, buffer: Buffer):
-        buffer.write_uint16(len(self.name))
-        buffer.write_fmt("3f", *self.origin)
-        buffer.write_uint32(len(self.meshes))
-        for mesh in self.meshes:
-            mesh.to_buffer(buffer)
+    def to_buffer(self, buffer: Buffer, compression_level: int = 9):
+        mesh_count = MODEL_INSTANCE_FLAG | self.source if self.is_instance else len(self.meshes)
+        MODEL.write(buffer, len(self.name), *self.origin, mesh_count)
+        if not self.is_instance:
+            for mesh in self.meshes:
+                mesh.to_buffer(buffer, compression_level)
         buffer.write_ascii_string(self.name)
         return buffer
@@ -0,0 +1,118 @@
+"""Vertex attribute encodings, everything is dequantized back to float32 on load."""
+from enum import IntEnum
+from typing import Optional
+
+import numpy as np
+
+
+class AttributeEncoding(IntEnum):
+    FLOAT32 = 0
+    SNORM16_BOUNDS = 1  # int16 normalized to bounds, min and max float32 vectors precede the data
+    OCTAHEDRAL16 = 2  # unit vectors as 2 x int16 octahedral coordinates
+    OCTAHEDRAL8 = 3  # unit vectors as 2 x int8 octahedral coordinates
+    UNORM16 = 4  # uint16 mapped to [0, 1]
+    HALF = 5  # float16
+
+
+_ITEM_TYPES = {
+    AttributeEncoding.FLOAT32: np.float32,
+    AttributeEncoding.SNORM16_BOUNDS: np.int16,
+    AttributeEncoding.OCTAHEDRAL16: np.int16,
+    AttributeEncoding.OCTAHEDRAL8: np.int8,
+    AttributeEncoding.UNORM16: np.uint16,
+    AttributeEncoding.HALF: np.float16,
+}
+
+
+def encoding_item_size(encoding: AttributeEncoding) -> int:
+    return np.dtype(_ITEM_TYPES[encoding]).itemsize
+
+
+def encoding_stride(encoding: AttributeEncoding, component_count: int) -> int:
+    """Bytes per encoded vertex, octahedral encodings store 3 component vectors as 2 coordinates"""
+    if encoding in (AttributeEncoding.OCTAHEDRAL16, AttributeEncoding.OCTAHEDRAL8):
+        component_count = 2
+    return encoding_item_size(encoding) * component_count
+
+
+def encoding_header_size(encoding: AttributeEncoding, component_count: int) -> int:
+    if encoding == AttributeEncoding.SNORM16_BOUNDS:
+        return 2 * component_count * 4
+    return 0
+
+
+def quantize_attribute(encoding: AttributeEncoding, data: np.ndarray,
+                       bounds: Optional[np.ndarray] = None) -> tuple[bytes, np.ndarray]:
+    """Returns encoding header and encoded item array. bounds is a (2, components) min/max array,
+    data's own bounds are used when it is not given"""
+    data = np.asarray(data, np.float32)
+    if encoding == AttributeEncoding.FLOAT32:
+        return b"", np.ascontiguousarray(data)
+    if encoding == AttributeEncoding.SNORM16_BOUNDS:
+        if bounds is None:
+            if data.shape[0]:
+                bounds = np.stack((data.min(axis=0), data.max(axis=0)))
+            else:
+                bounds = np.zeros((2, data.shape[1]), np.float32)
+        bounds = np.asarray(bounds, np.float32).reshape(2, -1)
+        extent = bounds[1] - bounds[0]
+        normalized = (data - bounds[0]) / np.where(extent > 0, extent, 1)
+        quantized = np.round(np.clip(normalized, 0, 1) * 65535) - 32768
+        return bounds.tobytes(), quantized.astype(np.int16)
+    if encoding in (AttributeEncoding.OCTAHEDRAL16, AttributeEncoding.OCTAHEDRAL8):
+        if data.shape[1] != 3:
+            raise ValueError(f"Octahedral encoding needs 3 component vectors, got {data.shape[1]}")
+        scale = 32767 if encoding == AttributeEncoding.OCTAHEDRAL16 else 127
+        encoded = np.round(octahedral_encode(data) * scale)
+        return b"", encoded.astype(_ITEM_TYPES[encoding])
+    if encoding == AttributeEncoding.UNORM16:
+        return b"", np.round(np.clip(data, 0, 1) * 65535).astype(np.uint16)
+    if encoding == AttributeEncoding.HALF:
+        return b"", data.astype(np.float16)
+    raise ValueError(f"Unknown attribute encoding: {encoding}")
+
+
+def encoding_bounds(encoding: AttributeEncoding, data, component_count: int) -> Optional[np.ndarray]:
+    """Copy of the (2, components) min/max header of SNORM16_BOUNDS data, None for other encodings"""
+    if encoding != AttributeEncoding.SNORM16_BOUNDS:
+        return None
+    return np.frombuffer(data, np.float32, 2 * component_count).reshape(2, component_count).copy()
+
+
+def dequantize_attribute(encoding: AttributeEncoding, data, component_count: int) -> np.ndarray:
+    if encoding == AttributeEncoding.FLOAT32:
+        return np.frombuffer(data, np.float32).reshape(-1, component_count)
+    header_size = encoding_header_size(encoding, component_count)
+    items = np.frombuffer(data, _ITEM_TYPES[encoding], offset=header_size)
+    if encoding == AttributeEncoding.SNORM16_BOUNDS:
+        bounds = np.frombuffer(data, np.float32, 2 * component_count).reshape(2, component_count)
+        normalized = (items.reshape(-1, component_count).astype(np.float32) + 32768) / 65535
+        return normalized * (bounds[1] - bounds[0]) + bounds[0]
+    if encoding in (AttributeEncoding.OCTAHEDRAL16, AttributeEncoding.OCTAHEDRAL8):
+        scale = 32767 if encoding == AttributeEncoding.OCTAHEDRAL16 else 127
+        return octahedral_decode(np.clip(items.reshape(-1, 2).astype(np.float32) / scale, -1, 1))
+    if encoding == AttributeEncoding.UNORM16:
+        return items.reshape(-1, component_count).astype(np.float32) / 65535
+    if encoding == AttributeEncoding.HALF:
+        return items.reshape(-1, component_count).astype(np.float32)
+    raise ValueError(f"Unknown attribute encoding: {encoding}")
+
+
+def octahedral_encode(vectors: np.ndarray) -> np.ndarray:
+    """Maps unit vectors to [-1, 1] square coordinates"""
+    l1_norm = np.abs(vectors).sum(axis=1, keepdims=True)
+    projected = vectors[:, :2] / np.where(l1_norm > 0, l1_norm, 1)
+    lower = vectors[:, 2] < 0
+    signs = np.where(projected[lower] >= 0, 1.0, -1.0)
+    projected[lower] = (1 - np.abs(projected[lower][:, ::-1])) * signs
+    return projected
+
+
+def octahedral_decode(coordinates: np.ndarray) -> np.ndarray:
+    vectors = np.empty((coordinates.shape[0], 3), np.float32)
+    vectors[:, :2] = coordinates
+    vectors[:, 2] = 1 - np.abs(coordinates).sum(axis=1)
+    fold = np.clip(-vectors[:, 2], 0, None)
+    vectors[:, :2] -= np.where(vectors[:, :2] >= 0, fold[:, None], -fold[:, None])
+    length = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(length > 0, length, 1)
@@ -0,0 +1,58 @@
+"""Fixed size parts of VEC3 structures declared as field lists, each compiled once to a struct.Struct.
+
+Dynamic parts (attribute payloads, mesh lists, names) are read by the structures themselves after their layout.
+Run python -m voxel_core_model.model.schema to print the layouts in the notation of vec3_model_spec.md.
+"""
+import struct
+from dataclasses import dataclass, field
+
+from voxel_core_model.file_utils import Buffer
+
+_TYPE_NAMES = {"B": "uint8", "H": "uint16", "I": "uint32", "f": "float", "s": "char"}
+
+
+@dataclass(slots=True, frozen=True)
+class Layout:
+    name: str
+    fields: tuple[tuple[str, str], ...]  # (field name, struct format code), a code may repeat its type like 3f
+    compiled: struct.Struct = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "compiled", struct.Struct("<" + "".join(code for _, code in self.fields)))
+
+    @property
+    def size(self) -> int:
+        return self.compiled.size
+
+    def read(self, buffer: Buffer) -> tuple:
+        """Values of all fields in order, repeated codes like 3f unpack to several values"""
+        return buffer.read_struct(self.compiled)
+
+    def write(self, buffer: Buffer, *values):
+        buffer.write_struct(self.compiled, *values)
+
+    def describe(self) -> str:
+        lines = [f"struct {self.name} {{"]
+        for name, code in self.fields:
+            count, type_code = code[:-1], code[-1]
+            lines.append(f"    {_TYPE_NAMES[type_code]}{f'[{count}]' if count else ''} {name};")
+        lines.append("};")
+        lines.append(f"sizeof({self.name}) == {self.size};")
+        return "\n".join(lines)
+
+
+HEADER = Layout("Header", (("ident", "8s"), ("version", "H"), ("reserved", "H")))
+BODY = Layout("Body", (("material_count", "H"), ("model_count", "H")))
+MATERIAL = Layout("Material", (("flags", "H"), ("name_len", "H")))
+MODEL = Layout("Model", (("name_len", "H"), ("origin", "3f"), ("mesh_count", "I")))
+MESH = Layout("Mesh", (("triangle_count", "I"), ("material_id", "H"), ("flags", "H"), ("attribute_count", "H")))
+VERTEX_ATTRIBUTE = Layout("VertexAttribute", (("type", "B"), ("flags", "B"), ("size", "I")))
+# Compressed attributes store decoded size in front of the payload, it is counted in size
+COMPRESSED_VERTEX_ATTRIBUTE = Layout("CompressedVertexAttribute",
+                                     (("type", "B"), ("flags", "B"), ("size", "I"), ("decoded_size", "I")))
+BLOCK_SIZE = Layout("BlockSize", (("size", "I"),))
+
+LAYOUTS = (HEADER, BODY, MATERIAL, MODEL, MESH, VERTEX_ATTRIBUTE, COMPRESSED_VERTEX_ATTRIBUTE, BLOCK_SIZE)
+
+if __name__ == "__main__":
+    print("\n\n".join(layout.describe() for layout in LAYOUTS))
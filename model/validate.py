@@ -0,0 +1,131 @@
+"""Structural checks for untrusted files, run on lazily loaded models before any attribute payload is decoded"""
+from typing import Iterable
+
+from voxel_core_model.model.codec import CODECS
+from voxel_core_model.model.material import Material
+from voxel_core_model.model.mesh import Mesh, MeshFlags, MESH_CODEC_MASK, MESH_CODEC_SHIFT
+from voxel_core_model.model.model import Model
+from voxel_core_model.model.quantize import AttributeEncoding, encoding_header_size, encoding_stride
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType, \
+    ATTRIBUTE_CODEC_MASK, ATTRIBUTE_CODEC_SHIFT, ATTRIBUTE_ENCODING_MASK, ATTRIBUTE_ENCODING_SHIFT
+
+_MESH_FLAGS_MASK = MeshFlags.GZIP | MeshFlags.USHORT_INDICES | MeshFlags.FILTERED | MESH_CODEC_MASK
+
+
+class ValidationError(ValueError):
+    """Raised for structurally invalid bodies, problems holds every issue found"""
+
+    def __init__(self, problems: list[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def attribute_problems(attribute: VertexAttribute) -> list[str]:
+    """Checks flags and that the payload size is a whole number of items of the attribute's encoding"""
+    if attribute.block is None:
+        return []
+    flags = attribute.block.flags
+    problems = []
+    if flags & VertexAttributeFlags.GZIP:
+        codec_id = (flags & ATTRIBUTE_CODEC_MASK) >> ATTRIBUTE_CODEC_SHIFT
+        if codec_id not in CODECS:
+            problems.append(f"{attribute.type.name} uses unavailable codec {codec_id}")
+    encoding_id = (flags & ATTRIBUTE_ENCODING_MASK) >> ATTRIBUTE_ENCODING_SHIFT
+    if encoding_id not in AttributeEncoding._value2member_map_:
+        problems.append(f"{attribute.type.name} uses unknown encoding {encoding_id}")
+        return problems
+    encoding = AttributeEncoding(encoding_id)
+    component_count = attribute.type.data_type()[1]
+    if encoding in (AttributeEncoding.OCTAHEDRAL16, AttributeEncoding.OCTAHEDRAL8) and component_count != 3:
+        problems.append(f"{attribute.type.name} can not use {encoding.name} encoding")
+    data_size = attribute.block.decoded_size - encoding_header_size(encoding, component_count)
+    stride = encoding_stride(encoding, component_count)
+    if data_size < 0 or data_size % stride:
+        problems.append(f"{attribute.type.name} size {attribute.block.decoded_size} does not match "
+                        f"{encoding.name} stride {stride}")
+    return problems
+
+
+def pool_size(attribute: VertexAttribute) -> int:
+    """Number of items in attribute, known from the block size without decoding it"""
+    if attribute.is_loaded or attribute.block is None:
+        return attribute.data.shape[0]
+    encoding = attribute.encoding
+    component_count = attribute.type.data_type()[1]
+    data_size = attribute.block.decoded_size - encoding_header_size(encoding, component_count)
+    return data_size // encoding_stride(encoding, component_count)
+
+
+def mesh_problems(mesh: Mesh, material_count: int) -> list[str]:
+    """Checks material, flags and attributes of mesh, indices are left encoded"""
+    problems = []
+    if mesh.material_id >= material_count:
+        problems.append(f"material {mesh.material_id} out of range")
+    flags = mesh.flags
+    if flags & ~_MESH_FLAGS_MASK:
+        problems.append(f"unknown mesh flags {flags:#x}")
+    if flags & MeshFlags.GZIP and (flags & MESH_CODEC_MASK) >> MESH_CODEC_SHIFT not in CODECS:
+        problems.append(f"indices use unavailable codec {(flags & MESH_CODEC_MASK) >> MESH_CODEC_SHIFT}")
+    types = [attribute.type for attribute in mesh.attributes]
+    if VertexAttributeType.POSITION not in types:
+        problems.append("no position attribute")
+    if len(set(types)) != len(types):
+        problems.append("duplicate attribute types")
+    for attribute in mesh.attributes:
+        problems.extend(attribute_problems(attribute))
+    return problems
+
+
+def index_problems(mesh: Mesh) -> list[str]:
+    """Decodes indices and checks each column against the pool size of its attribute in one pass"""
+    if not mesh.attributes:
+        return []
+    try:
+        indices = mesh.indices.reshape(-1, len(mesh.attributes))
+    except Exception as e:  # anything a codec raises on corrupted payload
+        return [f"{block_name(mesh)} can not be decoded: {e}"]
+    if not indices.size:
+        return []
+    pool_sizes = [pool_size(attribute) for attribute in mesh.attributes]
+    # A flat max is much faster than a per column reduction and settles the common valid case
+    if indices.max() < min(pool_sizes):
+        return []
+    return [f"{attribute.type.name} index out of range"
+            for i, (attribute, size) in enumerate(zip(mesh.attributes, pool_sizes)) if indices[:, i].max() >= size]
+
+
+def find_problems(models: Iterable[Model], materials: list[Material], check_indices: bool = True) -> list[str]:
+    """Checks names and every mesh of models, indices are only decoded for meshes whose structure is valid"""
+    # Names are read as latin-1 but written as ascii
+    problems = [f"material name {material.name!r} is not ascii"
+                for material in materials if not material.name.isascii()]
+    for model in models:
+        if not model.name.isascii():
+            problems.append(f"model name {model.name!r} is not ascii")
+        if model.is_instance:
+            continue
+        for mesh_id, mesh in enumerate(model.meshes):
+            found = mesh_problems(mesh, len(materials))
+            if not found and check_indices:
+                found = index_problems(mesh)
+            problems.extend(f"{model.name}[{mesh_id}]: {problem}" for problem in found)
+    return problems
+
+
+def check_models(models: Iterable[Model], materials: list[Material], check_indices: bool = True):
+    problems = find_problems(models, materials, check_indices)
+    if problems:
+        raise ValidationError(problems)
+
+
+def block_name(item: VertexAttribute | Mesh) -> str:
+    kind = "index" if isinstance(item, Mesh) else item.type.name
+    return f"{kind} block at offset {item.block.offset}"
+
+
+def decode_checked(item: VertexAttribute | Mesh, keep_block: bool = True):
+    """Decodes the pending payload of item, any failure is reported as ValidationError naming the block"""
+    try:
+        return item.decode(keep_block)
+    except Exception as e:  # anything a codec or a malformed payload layout raises
+        raise ValidationError([f"{block_name(item)}: {e}"]) from e
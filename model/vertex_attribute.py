@@ -1,15 +1,28 @@
-import gzip
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import IntFlag, IntEnum
+from typing import Optional
 
 import numpy as np
 
 from voxel_core_model.file_utils import Buffer
+from voxel_core_model.model.block import EncodedBlock
+from voxel_core_model.model.codec import BlockCodec, get_codec
+from voxel_core_model.model.filters import byte_shuffle, byte_unshuffle
+from voxel_core_model.model.quantize import AttributeEncoding, dequantize_attribute, encoding_bounds, \
+    encoding_header_size, encoding_item_size, quantize_attribute
+from voxel_core_model.model.schema import BLOCK_SIZE, COMPRESSED_VERTEX_ATTRIBUTE, VERTEX_ATTRIBUTE
 
 
 class VertexAttributeFlags(IntFlag):
     NONE = 0
-    GZIP = 1
+    GZIP = 1  # block is compressed, codec is selected by codec bits, 0 is gzip
+    FILTERED = 2
+
+
+ATTRIBUTE_CODEC_SHIFT = 2
+ATTRIBUTE_CODEC_MASK = 0b111 << ATTRIBUTE_CODEC_SHIFT
+ATTRIBUTE_ENCODING_SHIFT = 5
+ATTRIBUTE_ENCODING_MASK = 0b111 << ATTRIBUTE_ENCODING_SHIFT
 
 
 class VertexAttributeType(IntEnum):
@@ -19,7 +32,7 @@ class VertexAttributeType(IntEnum):
     COLOR = 4
 
     def data_type(self) -> tuple[np.number, int]:
-        """Returns a tuple of component numpy type and component count"""
+        """Returns a tuple of decoded component numpy type and component count"""
         if self == VertexAttributeType.POSITION:
             return np.float32, 3
         elif self == VertexAttributeType.NORMAL:
@@ -35,33 +48,107 @@ class VertexAttributeType(IntEnum):
 class VertexAttribute:
     type: VertexAttributeType
     flags: VertexAttributeFlags
-    data: np.ndarray
+    _data: Optional[np.ndarray] = None
+    _block: Optional[EncodedBlock] = field(default=None, repr=False)
+    # (2, components) min/max for SNORM16_BOUNDS, decoding restores the stored bounds so re-encoding keeps them
+    bounds: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # Supplied data supersedes an encoded block, so encode() never writes the old payload for it
+        if self._data is not None and self._block is not None:
+            object.__setattr__(self, "_block", None)
+
+    @property
+    def data(self) -> np.ndarray:
+        """Attribute data, lazily loaded attributes are decoded on first access"""
+        if self._data is None:
+            data, bounds = self._decode(self.type, self._block)
+            object.__setattr__(self, "_data", data)
+            if self.bounds is None:
+                object.__setattr__(self, "bounds", bounds)
+        return self._data
+
+    @property
+    def block(self) -> Optional[EncodedBlock]:
+        return self._block
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def codec(self) -> BlockCodec:
+        return BlockCodec((self.flags & ATTRIBUTE_CODEC_MASK) >> ATTRIBUTE_CODEC_SHIFT)
+
+    @property
+    def encoding(self) -> AttributeEncoding:
+        return AttributeEncoding((self.flags & ATTRIBUTE_ENCODING_MASK) >> ATTRIBUTE_ENCODING_SHIFT)
+
+    def decode(self, keep_block: bool = True):
+        """Decode pending payload now, optionally dropping the encoded block afterwards"""
+        self.data
+        if not keep_block:
+            object.__setattr__(self, "_block", None)
+        return self
 
     @classmethod
-    def from_buffer(cls, buffer: Buffer):
-        v_type = VertexAttributeType(buffer.read_uint8())
-        flags = VertexAttributeFlags(buffer.read_uint8())
-        size = buffer.read_uint32()
+    def from_buffer(cls, buffer: Buffer, lazy: bool = False):
+        v_type, flags, size = VERTEX_ATTRIBUTE.read(buffer)
+        v_type = VertexAttributeType(v_type)
+        flags = VertexAttributeFlags(flags)
 
         if flags & VertexAttributeFlags.GZIP:
-            decompressed_size = buffer.read_uint32()
-            data = gzip.decompress(buffer.read(size - 4))
-            if len(data) != decompressed_size:
-                raise ValueError("Decompressed data size does not match: {}!={}".format(len(data), decompressed_size))
+            if size < BLOCK_SIZE.size:
+                raise ValueError(f"Compressed {v_type.name} attribute size {size} is too small")
+            decompressed_size, = BLOCK_SIZE.read(buffer)
+            offset = buffer.tell()
+            block = EncodedBlock(flags, buffer.read_view(size - 4), decompressed_size, offset)
         else:
-            data = buffer.read(size)
-        return cls(v_type, flags, np.frombuffer(data, np.float32).reshape(-1, v_type.data_type()[1]))
+            offset = buffer.tell()
+            block = EncodedBlock(flags, buffer.read_view(size), size, offset)
+        if lazy:
+            return cls(v_type, flags, None, block)
+        data, bounds = cls._decode(v_type, block)
+        return cls(v_type, flags, data, bounds=bounds)
 
-    def to_buffer(self, buffer: Buffer):
-        buffer.write_fmt("2B", self.type, self.flags)
+    @staticmethod
+    def _decode(v_type: VertexAttributeType, block: EncodedBlock) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """Returns decoded data and the bounds stored with it"""
+        if block.flags & VertexAttributeFlags.GZIP:
+            codec = get_codec((block.flags & ATTRIBUTE_CODEC_MASK) >> ATTRIBUTE_CODEC_SHIFT)
+            data = codec.decompress(block.payload, block.decoded_size)
+            if len(data) != block.decoded_size:
+                raise ValueError("Decompressed data size does not match: {}!={}".format(len(data), block.decoded_size))
+        else:
+            data = block.payload
+        component_count = v_type.data_type()[1]
+        encoding = AttributeEncoding((block.flags & ATTRIBUTE_ENCODING_MASK) >> ATTRIBUTE_ENCODING_SHIFT)
+        if block.flags & VertexAttributeFlags.FILTERED:
+            header_size = encoding_header_size(encoding, component_count)
+            data = bytes(data[:header_size]) + byte_unshuffle(data[header_size:], encoding_item_size(encoding))
+        return dequantize_attribute(encoding, data, component_count), encoding_bounds(encoding, data, component_count)
+
+    def encode(self, compression_level: int = 9) -> EncodedBlock:
+        """Returns payload as it will be written, blocks that already match current flags are reused as is"""
+        if self._block is not None and self._block.flags == self.flags:
+            return self._block
+        values = self.data  # decoding restores bounds of a loaded attribute
+        header, items = quantize_attribute(self.encoding, values, self.bounds)
+        data = memoryview(items.reshape(-1)).cast("B")
+        if self.flags & VertexAttributeFlags.FILTERED:
+            data = byte_shuffle(data, items.dtype.itemsize)
+        if header:
+            data = header + bytes(data)
+        if self.flags & VertexAttributeFlags.GZIP:
+            return EncodedBlock(self.flags, get_codec(self.codec).compress(data, compression_level), len(data))
+        return EncodedBlock(self.flags, data, len(data))
 
+    def to_buffer(self, buffer: Buffer, compression_level: int = 9):
+        block = self.encode(compression_level)
         if self.flags & VertexAttributeFlags.GZIP:
-            data = gzip.compress(self.data.tobytes())
-            buffer.write_uint32(len(data) + 4)
-            buffer.write_uint32(self.data.nbytes)
-            buffer.write(data)
+            COMPRESSED_VERTEX_ATTRIBUTE.write(buffer, self.type, self.flags, block.size + 4, block.decoded_size)
         else:
-            buffer.write_uint32(self.data.nbytes)
-            buffer.write(self.data.data)
+            VERTEX_ATTRIBUTE.write(buffer, self.type, self.flags, block.size)
+        buffer.write(block.payload)
 
         return buffer
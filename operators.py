@@ -0,0 +1,243 @@
+import os
+from pathlib import Path
+
+import bpy
+from bpy.props import StringProperty, CollectionProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+
+from voxel_core_model.export_cache import ExportCache
+from voxel_core_model.exporter import ExportOptions, export_vec3_to_buffer
+from voxel_core_model.importer import import_vec3
+from voxel_core_model.file_utils import BufferedFileBuffer, MappedFileBuffer, replace_on_success
+from voxel_core_model.geometry.weld import WeldTolerance
+from voxel_core_model.model.codec import BlockCodec, CODECS
+from voxel_core_model.model.quantize import AttributeEncoding
+from voxel_core_model.mesh_utils import is_blender_4_1
+from voxel_core_model.profiling import Profiler, profile
+
+# Lives for the Blender session, so repeated exports of the same scene reuse unchanged objects
+_export_cache = ExportCache()
+# Phase timings of the last import or export as Profiler.as_dict, for scripts
+last_profile: dict[str, dict] = {}
+# Summed (before, after) stats of optimization passes of the last export, like VertexCacheStats
+last_stats: dict[str, tuple] = {}
+
+
+class OperatorHelper(bpy.types.Operator):
+    if is_blender_4_1():
+        directory: StringProperty(subtype='FILE_PATH', options={'SKIP_SAVE', 'HIDDEN'})
+    filepath: StringProperty(subtype='FILE_PATH', default="model.vec3")
+    files: CollectionProperty(name='File paths', type=bpy.types.OperatorFileListElement)
+
+    def get_directory(self):
+        if is_blender_4_1():
+            return Path(self.directory)
+        else:
+            filepath = Path(self.filepath)
+            print(filepath)
+            if filepath.is_file():
+                return filepath.parent.absolute()
+            else:
+                return filepath.absolute()
+
+    def report_profile(self, profiler: Profiler):
+        global last_profile, last_stats
+        last_profile = profiler.as_dict()
+        last_stats = dict(profiler.stats)
+        for line in profiler.report():
+            print(line)
+            self.report({'INFO'}, line)
+
+
+class ImportOperatorHelper(OperatorHelper):
+    need_popup = True
+
+    def invoke_popup(self, context, confirm_text=""):
+        if self.properties.is_property_set("filepath"):
+            title = self.filepath
+            if len(self.files) > 1:
+                title = f"Import {len(self.files)} files"
+
+            if not confirm_text:
+                confirm_text = self.bl_label
+            return context.window_manager.invoke_props_dialog(self, confirm_text=confirm_text, title=title,
+                                                              translate=False)
+
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def invoke(self, context, event):
+        if is_blender_4_1() and self.directory and self.files:
+            if self.need_popup:
+                return self.invoke_popup(context)
+            else:
+                return self.execute(context)
+        wm = context.window_manager
+        wm.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class ExportOperatorHelper(OperatorHelper):
+    def invoke(self, context, event):
+        wm = context.window_manager
+        wm.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class VOXELCORE_OT_VEC3Import(ImportOperatorHelper, ImportHelper):
+    """Load VC vec3 models"""
+    bl_idname = "voxelcore.import_vec3"
+    bl_label = "Import Voxel Core vec3 model"
+    bl_options = {'UNDO'}
+
+    filter_glob: StringProperty(default="*.vec3", options={'HIDDEN'})
+
+    workers: IntProperty(default=os.cpu_count() or 1, min=1, name="Threads",
+                         description="Number of threads used to decompress mesh data")
+
+    def execute(self, context):
+        directory = self.get_directory()
+
+        with profile() as profiler:
+            for file in self.files:
+                filepath = directory / file.name
+                with MappedFileBuffer(filepath) as f:
+                    import_vec3(f, self.workers)
+        self.report_profile(profiler)
+        return {'FINISHED'}
+
+
+class VOXELCORE_OT_VEC3Export(ExportOperatorHelper, ExportHelper):
+    """Save VOXELCORE vec3 models"""
+    bl_idname = "voxelcore.export_vec3"
+    bl_label = "Export Voxel Core vec3 model"
+    bl_options = {'UNDO', 'PRESET'}
+
+    # ExportHelper mixin class uses this
+    filename_ext = ".vec3"
+
+    filter_glob: StringProperty(default="*.vec3", options={'HIDDEN'})
+
+    compress: BoolProperty(default=False, name="Compress", description="Compress mesh data")
+    codec: EnumProperty(name="Codec", default=BlockCodec.GZIP.name,
+                        items=[(BlockCodec(codec_id).name, codec.name, "") for codec_id, codec in CODECS.items()],
+                        description="Compression codec, anything but gzip requires engine support")
+    compression_level: IntProperty(default=9, min=0, max=22, name="Compression level",
+                                   description="Codec specific compression level, lower is faster, higher is smaller")
+    workers: IntProperty(default=os.cpu_count() or 1, min=1, name="Threads",
+                         description="Number of threads used to compress mesh data")
+    weld_position_tolerance: FloatProperty(default=0.0, min=0.0, precision=5,
+                                           name="Position weld tolerance",
+                                           description="Grid cell size, vertices rounding to the same cell "
+                                                       "are merged. 0 merges exact duplicates only")
+    weld_normal_tolerance: FloatProperty(default=0.0, min=0.0, precision=5, name="Normal weld tolerance",
+                                         description="Grid cell size, normals rounding to the same cell are merged. "
+                                                     "0 merges exact duplicates only")
+    weld_uv_tolerance: FloatProperty(default=0.0, min=0.0, precision=5, name="UV weld tolerance",
+                                     description="Grid cell size, UVs rounding to the same cell are merged. "
+                                                 "0 merges exact duplicates only")
+    optimize_vertex_cache: BoolProperty(default=False, name="Optimize vertex cache",
+                                        description="Reorder triangles for GPU vertex cache locality, "
+                                                    "slow on big meshes")
+    optimize_vertex_fetch: BoolProperty(default=False, name="Optimize vertex fetch",
+                                        description="Order vertex data by first use for memory locality")
+    filter_blocks: BoolProperty(default=False, name="Filter blocks",
+                                description="Delta encode indices and byte-shuffle attributes before compression. "
+                                            "Smaller files, requires engine support")
+    position_encoding: EnumProperty(name="Positions", default=AttributeEncoding.FLOAT32.name,
+                                    items=[(AttributeEncoding.FLOAT32.name, "Float", ""),
+                                           (AttributeEncoding.SNORM16_BOUNDS.name, "Int16",
+                                            "Normalized to model bounds")],
+                                    description="Position encoding, quantized encodings require engine support")
+    normal_encoding: EnumProperty(name="Normals", default=AttributeEncoding.FLOAT32.name,
+                                  items=[(AttributeEncoding.FLOAT32.name, "Float", ""),
+                                         (AttributeEncoding.OCTAHEDRAL16.name, "Octahedral 16", "2 x int16"),
+                                         (AttributeEncoding.OCTAHEDRAL8.name, "Octahedral 8", "2 x int8")],
+                                  description="Normal encoding, quantized encodings require engine support")
+    uv_encoding: EnumProperty(name="UVs", default=AttributeEncoding.FLOAT32.name,
+                              items=[(AttributeEncoding.FLOAT32.name, "Float", ""),
+                                     (AttributeEncoding.UNORM16.name, "Unorm16", "Falls back to half for tiled UVs"),
+                                     (AttributeEncoding.HALF.name, "Half", "")],
+                              description="UV encoding, quantized encodings require engine support")
+    instance_linked: BoolProperty(default=False, name="Instance linked meshes",
+                                  description="Write objects sharing mesh data and without modifiers once, "
+                                              "requires engine support")
+    use_cache: BoolProperty(default=False, name="Cache",
+                            description="Reuse converted meshes of objects unchanged since the last export")
+    cache_size: IntProperty(default=256, min=0, name="Cache size (MiB)",
+                            description="Memory kept for cached meshes, least recently exported objects are dropped")
+
+    def invoke(self, context, event):
+        # Set a default filepath
+        self.filepath = bpy.path.ensure_ext(bpy.data.filepath or "model", ".vec3")
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        if not self.filepath:
+            raise Exception("No filename provided")
+        # A failed export leaves an existing file untouched instead of truncating it
+        with profile() as profiler, replace_on_success(self.filepath) as temp_path, \
+                BufferedFileBuffer(temp_path, 'wb') as f:
+            tolerance = WeldTolerance(self.weld_position_tolerance, self.weld_normal_tolerance, self.weld_uv_tolerance)
+            options = ExportOptions(self.compress, self.compression_level, BlockCodec[self.codec], self.filter_blocks,
+                                    self.optimize_vertex_cache, self.optimize_vertex_fetch, tolerance, self.workers,
+                                    AttributeEncoding[self.position_encoding], AttributeEncoding[self.normal_encoding],
+                                    AttributeEncoding[self.uv_encoding], self.instance_linked)
+            cache = None
+            if self.use_cache:
+                cache = _export_cache
+                cache.max_bytes = self.cache_size * 1024 * 1024
+                cache.evict()
+            else:
+                _export_cache.clear()
+            export_vec3_to_buffer(f, context, options, cache)
+        self.report_profile(profiler)
+        return {'FINISHED'}
+
+
+class MATERIAL_PT_VoxelEngineProperties(bpy.types.Panel):
+    bl_label = "Voxel Engine Material Properties"
+    bl_idname = "voxelcore.material_properties"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = 'material'
+
+    @classmethod
+    def poll(cls, context):
+        return context.material is not None
+
+    def draw(self, context):
+        layout = self.layout
+        material = context.material
+        layout.prop(material, "shadeless")
+
+
+classes = [VOXELCORE_OT_VEC3Import, VOXELCORE_OT_VEC3Export, MATERIAL_PT_VoxelEngineProperties]
+
+register_, unregister_ = bpy.utils.register_classes_factory(classes)
+
+
+def menu_import(self, context):
+    self.layout.operator(VOXELCORE_OT_VEC3Import.bl_idname)
+
+
+def menu_export(self, context):
+    self.layout.operator(VOXELCORE_OT_VEC3Export.bl_idname)
+
+
+def register():
+    register_()
+    bpy.types.Material.shadeless = bpy.props.BoolProperty(
+        name="Shadeless",
+        default=False
+    )
+    bpy.types.TOPBAR_MT_file_import.append(menu_import)
+    bpy.types.TOPBAR_MT_file_export.append(menu_export)
+
+
+def unregister():
+    bpy.types.TOPBAR_MT_file_import.remove(menu_import)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_export)
+    del bpy.types.Material.shadeless
+    unregister_()
@@ -0,0 +1,111 @@
+"""Phase timing for import and export, phases are only recorded while a profile() block is active"""
+import contextlib
+import functools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional
+
+
+@dataclass(slots=True)
+class PhaseStats:
+    seconds: float = 0.0
+    calls: int = 0
+    bytes: int = 0
+
+
+class Profiler:
+    """Accumulates wall time, call count and processed bytes per phase name. Nested phases are timed inclusively,
+    phases running on worker threads add up their thread time. Optimization passes add up their before and after
+    stats in stats."""
+
+    def __init__(self):
+        self.phases: dict[str, PhaseStats] = {}
+        self.stats: dict[str, tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, calls: int = 1):
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.seconds += seconds
+            stats.calls += calls
+            stats.bytes += nbytes
+
+    def record_stats(self, name: str, before, after):
+        with self._lock:
+            previous = self.stats.get(name)
+            if previous is not None:
+                before, after = previous[0] + before, previous[1] + after
+            self.stats[name] = before, after
+
+    def as_dict(self) -> dict[str, dict]:
+        return {name: {"seconds": stats.seconds, "calls": stats.calls, "bytes": stats.bytes}
+                for name, stats in self.phases.items()}
+
+    def report(self) -> list[str]:
+        lines = []
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].seconds):
+            line = f"{name}: {stats.seconds * 1000:.1f} ms, {stats.calls} calls"
+            if stats.bytes:
+                line += f", {stats.bytes / 1e6:.2f} MB ({stats.bytes / 1e6 / max(stats.seconds, 1e-9):.1f} MB/s)"
+            lines.append(line)
+        lines.extend(f"{name}: {before} -> {after}" for name, (before, after) in self.stats.items())
+        return lines
+
+
+_active: Optional[Profiler] = None
+
+
+@contextlib.contextmanager
+def profile(profiler: Optional[Profiler] = None) -> Iterator[Profiler]:
+    """Records phases of everything run inside the block, worker threads included"""
+    global _active
+    previous = _active
+    _active = profiler if profiler is not None else Profiler()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@contextlib.contextmanager
+def phase(name: str, nbytes: int = 0):
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record(name, time.perf_counter() - start, nbytes)
+
+
+def add_bytes(name: str, nbytes: int):
+    """Adds bytes to a phase when the size is only known once the phase finished"""
+    profiler = _active
+    if profiler is not None:
+        profiler.record(name, 0.0, nbytes, calls=0)
+
+
+def add_stats(name: str, before, after):
+    """Adds before and after stats of an optimization pass, stats objects are summed with +"""
+    profiler = _active
+    if profiler is not None:
+        profiler.record_stats(name, before, after)
+
+
+def profiled(name: str) -> Callable:
+    """Decorator recording every call of the function as phase name"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,75 @@
+"""Checks of material grouping, index width and mesh splitting in convert_to_vec3_meshes, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_convert from the directory holding the addon."""
+import unittest
+
+import numpy as np
+
+from voxel_core_model.geometry.convert import AXIS_SWAP, DIRECTION_SWAP, MAX_UBYTE_POOL_SIZE, MAX_USHORT_POOL_SIZE, \
+    convert_to_vec3_meshes
+from voxel_core_model.geometry.extract import IntermediateMesh
+from voxel_core_model.model.material import Material, MaterialFlags, MaterialTable
+from voxel_core_model.model.mesh import Mesh, MeshFlags
+from voxel_core_model.model.vertex_attribute import VertexAttributeType
+
+
+def make_triangle_soup(triangle_count: int, material_count: int = 1, seed: int = 0) -> IntermediateMesh:
+    """Triangles with three vertices of their own, so every corner adds a position to the pool"""
+    rng = np.random.default_rng(seed)
+    vertex_count = triangle_count * 3
+    return IntermediateMesh(
+        positions=rng.random((vertex_count, 3), np.float32),
+        normals=np.tile(np.array([0, 0, 1], np.float32), (vertex_count, 1)),
+        uvs=np.zeros((vertex_count, 2), np.float32),
+        polygons=np.arange(vertex_count, dtype=np.uint32).reshape(-1, 3),
+        material_ids=rng.integers(0, material_count, triangle_count).astype(np.uint32),
+        materials=[f"material{i}" for i in range(material_count)])
+
+
+def material_table(mesh_data: IntermediateMesh) -> MaterialTable:
+    return MaterialTable([Material(name, MaterialFlags.NONE) for name in mesh_data.materials])
+
+
+def corner_positions(mesh: Mesh) -> np.ndarray:
+    return mesh.attributes[VertexAttributeType.POSITION].data[mesh.indices[:, :, VertexAttributeType.POSITION]]
+
+
+class ConvertTest(unittest.TestCase):
+    def assert_same_triangles(self, meshes: list[Mesh], mesh_data: IntermediateMesh, material_id: int = 0):
+        """Meshes of one material hold its triangles in original order"""
+        positions = (mesh_data.positions * DIRECTION_SWAP)[:, AXIS_SWAP]
+        expected = positions[mesh_data.polygons[mesh_data.material_ids == material_id]]
+        np.testing.assert_array_equal(np.concatenate([corner_positions(mesh) for mesh in meshes]), expected)
+
+    def test_index_width(self):
+        for pool_size, short in ((MAX_UBYTE_POOL_SIZE, False), (MAX_UBYTE_POOL_SIZE + 3, True)):
+            with self.subTest(pool_size=pool_size):
+                mesh_data = make_triangle_soup(pool_size // 3)
+                mesh, = convert_to_vec3_meshes(mesh_data, material_table(mesh_data))
+                self.assertEqual(mesh.indices.dtype, np.uint16 if short else np.uint8)
+                self.assertEqual(bool(mesh.flags & MeshFlags.USHORT_INDICES), short)
+                self.assert_same_triangles([mesh], mesh_data)
+
+    def test_split_above_ushort_pool(self):
+        mesh_data = make_triangle_soup(MAX_USHORT_POOL_SIZE // 3 * 2 + 100)
+        meshes = convert_to_vec3_meshes(mesh_data, material_table(mesh_data))
+        self.assertGreater(len(meshes), 1)
+        for mesh in meshes:
+            self.assertLessEqual(max(attribute.data.shape[0] for attribute in mesh.attributes), MAX_USHORT_POOL_SIZE)
+            self.assertEqual(mesh.indices.dtype, np.uint16)
+        self.assertEqual(sum(mesh.triangle_count for mesh in meshes), mesh_data.polygons.shape[0])
+        self.assert_same_triangles(meshes, mesh_data)
+
+    def test_material_groups(self):
+        mesh_data = make_triangle_soup(300, material_count=3)
+        # Table order differs from slot order, meshes refer to table indices
+        materials = MaterialTable([Material(name, MaterialFlags.NONE) for name in reversed(mesh_data.materials)])
+        meshes = convert_to_vec3_meshes(mesh_data, materials)
+        self.assertEqual([mesh.material_id for mesh in meshes], [2, 1, 0])
+        for slot, mesh in enumerate(meshes):
+            self.assertEqual(mesh.indices.dtype, np.uint16 if mesh.triangle_count * 3 > MAX_UBYTE_POOL_SIZE
+                             else np.uint8)
+            self.assert_same_triangles([mesh], mesh_data, slot)
+
+
+if __name__ == "__main__":
+    unittest.main()
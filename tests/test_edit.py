@@ -0,0 +1,84 @@
+"""Checks of metadata edits on lazily loaded bodies, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_edit from the directory holding the addon."""
+import unittest
+
+import numpy as np
+
+from voxel_core_model.file_utils import MemoryBuffer, WritableMemoryBuffer
+from voxel_core_model.model.body import Body, load_model_from_buffer, write_model_to_buffer
+from voxel_core_model.model.edit import drop_models, rename_materials
+from voxel_core_model.model.material import Material, MaterialFlags
+from voxel_core_model.model.mesh import Mesh, MeshFlags
+from voxel_core_model.model.model import Model
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType
+
+
+def make_mesh(material_id: int, offset: float) -> Mesh:
+    positions = np.arange(9, dtype=np.float32).reshape(3, 3) + offset
+    return Mesh(material_id, MeshFlags.GZIP,
+                [VertexAttribute(VertexAttributeType.POSITION, VertexAttributeFlags.GZIP, positions)],
+                np.array([[[0], [1], [2]]], np.uint8))
+
+
+def write(body: Body) -> bytes:
+    buffer = WritableMemoryBuffer()
+    write_model_to_buffer(buffer, body)
+    return buffer.getvalue()
+
+
+def positions(model: Model) -> list[np.ndarray]:
+    return [mesh.attributes[0].data for mesh in model.meshes]
+
+
+class DropModelsTest(unittest.TestCase):
+    materials = [Material("stone", MaterialFlags.NONE), Material("glass", MaterialFlags.NONE)]
+
+    def setUp(self):
+        # a and c hold meshes, b and e are instances of a, d is an instance of c
+        models = [Model("a", (0.0, 0.0, 0.0), [make_mesh(0, 0.0), make_mesh(1, 10.0)]),
+                  Model("b", (1.0, 0.0, 0.0), [], source=0),
+                  Model("c", (2.0, 0.0, 0.0), [make_mesh(1, 20.0)]),
+                  Model("d", (3.0, 0.0, 0.0), [], source=2),
+                  Model("e", (4.0, 0.0, 0.0), [], source=0)]
+        self.data = write(Body(models, self.materials))
+        self.body = load_model_from_buffer(MemoryBuffer(self.data), lazy=True)
+
+    def assert_round_trip(self, body: Body, names: list[str], sources: list, meshes_of: list[str]):
+        """Writes body and loads it back, meshes_of names the original model whose meshes each model shows"""
+        original = {model.name: model for model in load_model_from_buffer(MemoryBuffer(self.data)).models}
+        loaded = load_model_from_buffer(MemoryBuffer(write(body)), validate=True).models
+        self.assertEqual([model.name for model in loaded], names)
+        self.assertEqual([model.source for model in loaded], sources)
+        for model, name in zip(loaded, meshes_of, strict=True):
+            self.assertEqual(model.origin, original[model.name].origin)
+            for data, expected in zip(positions(model), positions(original[name]), strict=True):
+                np.testing.assert_array_equal(data, expected)
+
+    def test_drop_instance(self):
+        self.assert_round_trip(drop_models(self.body, {"b"}), ["a", "c", "d", "e"], [None, None, 1, 0],
+                               ["a", "c", "c", "a"])
+
+    def test_drop_mesh_model_reindexes_sources(self):
+        self.assert_round_trip(drop_models(self.body, {"a"}), ["b", "c", "d", "e"], [None, None, 1, 0],
+                               ["a", "c", "c", "a"])
+
+    def test_drop_source_with_single_instance(self):
+        self.assert_round_trip(drop_models(self.body, {"c"}), ["a", "b", "d", "e"], [None, 0, None, 0],
+                               ["a", "a", "c", "a"])
+
+    def test_drop_source_and_first_instance(self):
+        self.assert_round_trip(drop_models(self.body, {"a", "b"}), ["c", "d", "e"], [None, 0, None],
+                               ["c", "c", "a"])
+
+    def test_drop_everything_sharing_meshes(self):
+        self.assert_round_trip(drop_models(self.body, {"a", "b", "e"}), ["c", "d"], [None, 0], ["c", "c"])
+
+    def test_merged_materials(self):
+        body = rename_materials(self.body, {"glass": "stone"})
+        self.assertEqual([material.name for material in body.materials], ["stone"])
+        loaded = load_model_from_buffer(MemoryBuffer(write(body)), validate=True)
+        self.assertEqual({mesh.material_id for model in loaded.models for mesh in model.meshes}, {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Checks of merge_meshes offsets, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_merge from the directory holding the addon."""
+import unittest
+
+import numpy as np
+
+from voxel_core_model.geometry.merge import merge_meshes
+from voxel_core_model.model.mesh import Mesh, MeshFlags
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType
+
+
+def make_mesh(rng: np.random.Generator, material_id: int, position_count: int, uv_count: int,
+              triangle_count: int) -> Mesh:
+    attributes = [VertexAttribute(VertexAttributeType.POSITION, VertexAttributeFlags.NONE,
+                                  rng.random((position_count, 3), np.float32)),
+                  VertexAttribute(VertexAttributeType.UV, VertexAttributeFlags.NONE,
+                                  rng.random((uv_count, 2), np.float32))]
+    indices = np.stack((rng.integers(0, position_count, (triangle_count, 3)),
+                        rng.integers(0, uv_count, (triangle_count, 3))), axis=2)
+    index_type = np.uint16 if max(position_count, uv_count) > 0xFF else np.uint8
+    return Mesh(material_id, MeshFlags.NONE, attributes, indices.astype(index_type))
+
+
+class MergeTest(unittest.TestCase):
+    def test_offsets(self):
+        rng = np.random.default_rng(0)
+        # Pools of different sizes per attribute, one of them above the uint8 range and one mesh without triangles
+        meshes = [make_mesh(rng, 0, 10, 4, 6), make_mesh(rng, 1, 300, 20, 50), make_mesh(rng, 2, 5, 5, 0),
+                  make_mesh(rng, 3, 7, 200, 9)]
+        merged = merge_meshes(meshes)
+        np.testing.assert_array_equal(merged.triangle_counts, [6, 50, 0, 9])
+        self.assertEqual(merged.indices.shape, (65, 3, 2))
+        self.assertEqual([attribute.shape[0] for attribute in merged.attributes], [322, 229])
+        # Every corner of the merged mesh resolves to the same values as in its source mesh
+        start = 0
+        for mesh in meshes:
+            end = start + mesh.triangle_count
+            for i, attribute in enumerate(mesh.attributes):
+                np.testing.assert_array_equal(merged.attributes[i][merged.indices[start:end, :, i]],
+                                              attribute.data[mesh.indices[:, :, i]])
+            start = end
+
+    def test_rejects_mismatched_layouts(self):
+        rng = np.random.default_rng(1)
+        mesh = make_mesh(rng, 0, 3, 3, 1)
+        with self.assertRaises(NotImplementedError):
+            merge_meshes([mesh, Mesh(1, MeshFlags.NONE, mesh.attributes[:1], mesh.indices[:, :, :1])])
+        with self.assertRaises(ValueError):
+            merge_meshes([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""Write and load round trips of synthetic bodies, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_roundtrip from the directory holding the addon."""
+import itertools
+import unittest
+from dataclasses import replace
+
+import numpy as np
+
+from voxel_core_model.file_utils import MemoryBuffer, WritableMemoryBuffer
+from voxel_core_model.model.body import Body, BodyReader, load_model_from_buffer, write_model_to_buffer
+from voxel_core_model.model.codec import BlockCodec, CODECS
+from voxel_core_model.model.material import Material, MaterialFlags
+from voxel_core_model.model.mesh import Mesh, MeshFlags, MESH_CODEC_SHIFT
+from voxel_core_model.model.model import Model
+from voxel_core_model.model.quantize import AttributeEncoding
+from voxel_core_model.model.schema import HEADER
+from voxel_core_model.model.validate import ValidationError
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType, \
+    ATTRIBUTE_CODEC_SHIFT, ATTRIBUTE_ENCODING_SHIFT
+
+# Position, normal and UV encodings written together
+ENCODINGS = (
+    (AttributeEncoding.FLOAT32, AttributeEncoding.FLOAT32, AttributeEncoding.FLOAT32),
+    (AttributeEncoding.SNORM16_BOUNDS, AttributeEncoding.OCTAHEDRAL16, AttributeEncoding.UNORM16),
+    (AttributeEncoding.HALF, AttributeEncoding.OCTAHEDRAL8, AttributeEncoding.HALF),
+)
+TOLERANCES = {
+    AttributeEncoding.FLOAT32: 0.0,
+    AttributeEncoding.SNORM16_BOUNDS: 1e-3,
+    AttributeEncoding.OCTAHEDRAL16: 1e-3,
+    AttributeEncoding.OCTAHEDRAL8: 5e-2,
+    AttributeEncoding.UNORM16: 1e-4,
+    AttributeEncoding.HALF: 5e-3,
+}
+# (lazy, workers, validate)
+LOAD_MODES = ((False, 1, False), (False, 4, False), (True, 1, False), (False, 4, True))
+
+
+def make_mesh(rng: np.random.Generator, material_id: int, pool_size: int, triangle_count: int,
+              mesh_flags: int = 0, attribute_flags: int = 0,
+              encodings: tuple[AttributeEncoding, ...] = ENCODINGS[0]) -> Mesh:
+    normals = rng.normal(size=(pool_size, 3)).astype(np.float32)
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    arrays = (rng.uniform(-5, 5, (pool_size, 3)).astype(np.float32), normals,
+              rng.random((pool_size, 2), np.float32))
+    types = (VertexAttributeType.POSITION, VertexAttributeType.NORMAL, VertexAttributeType.UV)
+    attributes = [VertexAttribute(v_type, VertexAttributeFlags(attribute_flags | encoding << ATTRIBUTE_ENCODING_SHIFT),
+                                  data)
+                  for v_type, encoding, data in zip(types, encodings, arrays)]
+    if pool_size > 0xFF:
+        mesh_flags |= MeshFlags.USHORT_INDICES
+    index_type = np.uint16 if mesh_flags & MeshFlags.USHORT_INDICES else np.uint8
+    indices = rng.integers(0, pool_size, (triangle_count, 3, len(attributes))).astype(index_type)
+    return Mesh(material_id, MeshFlags(mesh_flags), attributes, indices)
+
+
+def write(body: Body, workers: int = 1) -> bytes:
+    buffer = WritableMemoryBuffer()
+    write_model_to_buffer(buffer, body, workers=workers)
+    return buffer.getvalue()
+
+
+def header_version(data: bytes) -> int:
+    return HEADER.read(MemoryBuffer(data))[1]
+
+
+class RoundTripTest(unittest.TestCase):
+    materials = [Material("stone", MaterialFlags.NONE), Material("glass", MaterialFlags.NONE)]
+
+    def assert_meshes_close(self, loaded: Mesh, written: Mesh):
+        self.assertEqual(loaded.material_id, written.material_id)
+        np.testing.assert_array_equal(loaded.indices, written.indices)
+        for loaded_attribute, attribute in zip(loaded.attributes, written.attributes, strict=True):
+            self.assertEqual(loaded_attribute.type, attribute.type)
+            np.testing.assert_allclose(loaded_attribute.data, attribute.data, rtol=0,
+                                       atol=TOLERANCES[attribute.encoding], err_msg=attribute.type.name)
+
+    def test_flag_combinations(self):
+        rng = np.random.default_rng(0)
+        codec_ids = [None, *CODECS]  # None writes uncompressed blocks
+        for codec_id, filtered, encodings in itertools.product(codec_ids, (False, True), ENCODINGS):
+            mesh_flags = attribute_flags = 0
+            if codec_id is not None:
+                mesh_flags |= MeshFlags.GZIP | codec_id << MESH_CODEC_SHIFT
+                attribute_flags |= VertexAttributeFlags.GZIP | codec_id << ATTRIBUTE_CODEC_SHIFT
+            if filtered:
+                mesh_flags |= MeshFlags.FILTERED
+                attribute_flags |= VertexAttributeFlags.FILTERED
+            meshes = [make_mesh(rng, 0, 40, 60, mesh_flags, attribute_flags, encodings),
+                      make_mesh(rng, 1, 300, 500, mesh_flags, attribute_flags, encodings)]
+            body = Body([Model("block", (1.0, 2.0, 3.0), meshes)], self.materials)
+            data = write(body, workers=4)
+            is_v1 = not filtered and codec_id in (None, BlockCodec.GZIP) and encodings == ENCODINGS[0]
+            for lazy, workers, validate in LOAD_MODES:
+                with self.subTest(codec=codec_id, filtered=filtered, encodings=[e.name for e in encodings],
+                                  lazy=lazy, workers=workers, validate=validate):
+                    self.assertEqual(header_version(data), 1 if is_v1 else 2)
+                    loaded = load_model_from_buffer(MemoryBuffer(data), lazy, workers, validate)
+                    self.assertEqual(loaded.materials, self.materials)
+                    model, = loaded.models
+                    self.assertEqual(model.name, "block")
+                    self.assertEqual(model.origin, (1.0, 2.0, 3.0))
+                    for loaded_mesh, mesh in zip(model.meshes, meshes, strict=True):
+                        self.assert_meshes_close(loaded_mesh, mesh)
+
+    def test_lazy_rewrite_copies_blocks(self):
+        rng = np.random.default_rng(1)
+        mesh_flags = MeshFlags.GZIP | MeshFlags.FILTERED
+        attribute_flags = VertexAttributeFlags.GZIP | VertexAttributeFlags.FILTERED
+        body = Body([Model("block", (0.0, 0.0, 0.0),
+                           [make_mesh(rng, 0, 100, 200, mesh_flags, attribute_flags, ENCODINGS[1])])],
+                    self.materials)
+        data = write(body)
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                self.assertEqual(write(load_model_from_buffer(MemoryBuffer(data), lazy=True), workers), data)
+
+    def test_snorm_bounds_survive_rewrite(self):
+        rng = np.random.default_rng(2)
+        mesh = make_mesh(rng, 0, 100, 200, encodings=ENCODINGS[1])
+        # Bounds wider than the data, as shared by meshes of one model, are not recoverable from decoded values
+        bounds = np.array([[-10, -10, -10], [10, 10, 10]], np.float32)
+        mesh = replace(mesh, attributes=[replace(mesh.attributes[0], bounds=bounds), *mesh.attributes[1:]])
+        body = Body([Model("block", (0.0, 0.0, 0.0), [mesh])], self.materials)
+        first = load_model_from_buffer(MemoryBuffer(write(body)))
+        second = load_model_from_buffer(MemoryBuffer(write(first)))
+        position, _ = second.models[0].meshes[0].find_attribute(VertexAttributeType.POSITION)
+        np.testing.assert_array_equal(position, first.models[0].meshes[0].attributes[0].data)
+        np.testing.assert_array_equal(second.models[0].meshes[0].attributes[0].bounds, bounds)
+
+    def test_instances(self):
+        rng = np.random.default_rng(3)
+        flags = MeshFlags.GZIP
+        models = [Model("a", (0.0, 0.0, 0.0), [make_mesh(rng, 0, 30, 40, flags), make_mesh(rng, 1, 30, 40, flags)]),
+                  Model("b", (1.0, 0.0, 0.0), [], source=0),
+                  Model("c", (0.0, 1.0, 0.0), [make_mesh(rng, 1, 20, 10)]),
+                  Model("d", (0.0, 0.0, 1.0), [], source=2),
+                  Model("e", (1.0, 1.0, 0.0), [], source=0)]
+        data = write(Body(models, self.materials))
+        self.assertEqual(header_version(data), 3)
+        for lazy, workers, validate in LOAD_MODES:
+            with self.subTest(lazy=lazy, workers=workers, validate=validate):
+                loaded = load_model_from_buffer(MemoryBuffer(data), lazy, workers, validate).models
+                self.assertEqual([model.source for model in loaded], [None, 0, None, 2, 0])
+                for instance in (1, 3, 4):
+                    self.assertIs(loaded[instance].meshes, loaded[loaded[instance].source].meshes)
+                for loaded_model, model in zip(loaded, models):
+                    self.assertEqual(loaded_model.origin, model.origin)
+                    if not model.is_instance:
+                        for loaded_mesh, mesh in zip(loaded_model.meshes, model.meshes, strict=True):
+                            self.assert_meshes_close(loaded_mesh, mesh)
+        streamed = list(BodyReader(MemoryBuffer(data)))
+        self.assertIs(streamed[4].meshes, streamed[0].meshes)
+
+    def test_instances_need_version_3(self):
+        models = [Model("a", (0.0, 0.0, 0.0), [make_mesh(np.random.default_rng(4), 0, 10, 5)]),
+                  Model("b", (1.0, 0.0, 0.0), [], source=0)]
+        data = bytearray(write(Body(models, self.materials)))
+        data[8:10] = (2).to_bytes(2, "little")
+        for read in (lambda buffer: load_model_from_buffer(buffer), lambda buffer: list(BodyReader(buffer))):
+            with self.assertRaises(ValidationError):
+                read(MemoryBuffer(bytes(data)))
+
+
+if __name__ == "__main__":
+    unittest.main()
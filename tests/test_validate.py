@@ -0,0 +1,77 @@
+"""Checks that malformed files are reported as ValidationError, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_validate from the directory holding the addon."""
+import unittest
+
+import numpy as np
+
+from voxel_core_model.file_utils import MemoryBuffer, WritableMemoryBuffer
+from voxel_core_model.model.body import Body, load_model_from_buffer, write_model_to_buffer
+from voxel_core_model.model.material import Material, MaterialFlags
+from voxel_core_model.model.mesh import Mesh, MeshFlags
+from voxel_core_model.model.model import Model
+from voxel_core_model.model.validate import ValidationError
+from voxel_core_model.model.vertex_attribute import VertexAttribute, VertexAttributeFlags, VertexAttributeType
+
+
+def make_body(material_id: int = 0, max_index: int = 3, compressed: bool = False) -> Body:
+    attribute_flags = VertexAttributeFlags.GZIP if compressed else VertexAttributeFlags.NONE
+    attributes = [VertexAttribute(VertexAttributeType.POSITION, attribute_flags,
+                                  np.arange(12, dtype=np.float32).reshape(4, 3)),
+                  VertexAttribute(VertexAttributeType.UV, attribute_flags, np.zeros((4, 2), np.float32))]
+    indices = np.array([[[0, 0], [1, 1], [2, max_index]]], np.uint8)
+    mesh = Mesh(material_id, MeshFlags.GZIP if compressed else MeshFlags.NONE, attributes, indices)
+    return Body([Model("block", (0.0, 0.0, 0.0), [mesh]), Model("copy", (1.0, 0.0, 0.0), [], source=0)],
+                [Material("stone", MaterialFlags.NONE)])
+
+
+def write(body: Body) -> bytes:
+    buffer = WritableMemoryBuffer()
+    write_model_to_buffer(buffer, body)
+    return buffer.getvalue()
+
+
+class ValidateTest(unittest.TestCase):
+    def assert_invalid(self, data: bytes, problem: str, **kwargs) -> ValidationError:
+        with self.assertRaises(ValidationError) as context:
+            load_model_from_buffer(MemoryBuffer(data), validate=True, **kwargs)
+        self.assertIn(problem, str(context.exception))
+        return context.exception
+
+    def test_valid(self):
+        for compressed in (False, True):
+            with self.subTest(compressed=compressed):
+                body = load_model_from_buffer(MemoryBuffer(write(make_body(compressed=compressed))), validate=True)
+                self.assertIs(body.models[1].meshes, body.models[0].meshes)
+
+    def test_truncated(self):
+        for compressed in (False, True):
+            data = write(make_body(compressed=compressed))
+            for size in range(len(data)):
+                with self.subTest(compressed=compressed, size=size):
+                    with self.assertRaises(ValidationError):
+                        load_model_from_buffer(MemoryBuffer(data[:size]), validate=True)
+
+    def test_index_out_of_range(self):
+        data = write(make_body(max_index=4))
+        self.assert_invalid(data, "block[0]: UV index out of range")
+        # Without index checks the structure alone is valid
+        load_model_from_buffer(MemoryBuffer(data), lazy=True, validate=True, check_indices=False)
+
+    def test_material_out_of_range(self):
+        self.assert_invalid(write(make_body(material_id=1)), "block[0]: material 1 out of range")
+
+    def test_corrupted_payload(self):
+        data = bytearray(write(make_body(compressed=True)))
+        # The gzip stream of the index block sits right before the model name
+        name_offset = data.rindex(b"block")
+        data[name_offset - 12:name_offset - 8] = b"\xff\xff\xff\xff"
+        self.assert_invalid(bytes(data), "index block at offset")
+
+    def test_source_out_of_range(self):
+        body = make_body()
+        body = Body([*body.models[:1], Model("copy", (1.0, 0.0, 0.0), [], source=1)], body.materials)
+        self.assert_invalid(write(body), "refers to model 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
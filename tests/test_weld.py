@@ -0,0 +1,66 @@
+"""Checks of the hash table welder against np.unique, bpy free.
+Run with python -m unittest voxel_core_model.tests.test_weld from the directory holding the addon."""
+import unittest
+
+import numpy as np
+
+from voxel_core_model.geometry.weld import weld
+
+
+def unique_first_occurrence(data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Reference result: np.unique rows reordered to first occurrence order, with matching inverse"""
+    _, first, inverse = np.unique(data, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    return data[first[order]], rank[inverse.reshape(-1)]
+
+
+class WeldTest(unittest.TestCase):
+    def test_matches_unique(self):
+        rng = np.random.default_rng(0)
+        for row_count, pool_size in ((1, 1), (10, 3), (5000, 50), (20000, 20000)):
+            with self.subTest(rows=row_count, pool=pool_size):
+                pool = rng.random((pool_size, 3), np.float32)
+                data = pool[rng.integers(0, pool_size, row_count)]
+                unique, inverse = weld(data)
+                expected_unique, expected_inverse = unique_first_occurrence(data)
+                np.testing.assert_array_equal(unique, expected_unique)
+                np.testing.assert_array_equal(inverse, expected_inverse)
+                np.testing.assert_array_equal(unique[inverse], data)
+
+    def test_empty(self):
+        unique, inverse = weld(np.empty((0, 2), np.float32))
+        self.assertEqual(unique.shape, (0, 2))
+        self.assertEqual(inverse.size, 0)
+
+    def test_negative_zero_matches_zero(self):
+        unique, inverse = weld(np.array([[0.0, 1.0], [-0.0, 1.0]], np.float32))
+        self.assertEqual(unique.shape[0], 1)
+        np.testing.assert_array_equal(inverse, [0, 0])
+
+    def test_tolerance_cells(self):
+        # Cells are centered on multiples of the tolerance, 0.04 and 0.06 are close but fall on either side of 0.05
+        data = np.array([[0.04], [0.06], [0.14], [0.149], [-0.04]], np.float32)
+        unique, inverse = weld(data, 0.1)
+        np.testing.assert_array_equal(inverse, [0, 1, 1, 1, 0])
+        np.testing.assert_array_equal(unique, data[[0, 1]])
+
+    def test_per_column_tolerance(self):
+        # The second column has zero tolerance and is compared exactly
+        data = np.array([[1.01, 0.5], [0.99, 0.5], [1.0, 0.5000001], [3.0, 0.5]], np.float32)
+        _, inverse = weld(data, [0.1, 0.0])
+        np.testing.assert_array_equal(inverse, [0, 0, 1, 2])
+
+    def test_tolerance_matches_unique_of_cells(self):
+        rng = np.random.default_rng(1)
+        data = rng.normal(size=(10000, 3)).astype(np.float32)
+        tolerance = 0.25
+        _, inverse = weld(data, tolerance)
+        cells = np.floor(data / tolerance + 0.5).astype(np.int64)
+        _, expected_inverse = unique_first_occurrence(cells)
+        np.testing.assert_array_equal(inverse, expected_inverse)
+
+
+if __name__ == "__main__":
+    unittest.main()